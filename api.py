@@ -1,35 +1,131 @@
-import os
+import random
+from time import sleep, perf_counter
+
 import requests
-from credentials import API_HOST, TOKEN
+from requests.adapters import HTTPAdapter
+from outbox import Outbox
+from credentials import API_HOST, TOKEN, API_TIMEOUT, API_RETRIES, OUTBOX_PATH
+
+# Client errors of outbox updates who are retried later, instead of discarded
+RETRY_STATUS_CODES = [401, 403, 408, 429]
+
+
+class ApiError (Exception):
+    """ Base error of the backend api """
+
+
+class ApiConnectionError (ApiError):
+    """ Backend not reachable, or it not answer before timeout """
+
+
+class ApiResponseError (ApiError):
+    """ Backend answer with an error status code """
+    
+    def __init__ (self, endpoint:str, status_code:int):
+        self.endpoint = endpoint
+        self.status_code = status_code
+        super().__init__ (f"Error requesting '{endpoint}' from API, status code: {status_code}")
 
 
 class Api ():
+    
+    def __init__ (self, timeout:float=API_TIMEOUT, retries:int=API_RETRIES, backoff:float=0.5,
+                  metrics=None):
+        """ Client of the backend api, with connection pooling and retries
+
+        Args:
+            timeout (float, optional): seconds to wait for each request. Defaults to API_TIMEOUT.
+            retries (int, optional): extra attempts on connection errors and 5xx responses. Defaults to API_RETRIES.
+            backoff (float, optional): base seconds of exponential backoff between attempts. Defaults to 0.5.
+            metrics (Metrics, optional): metrics instance, to measure requests. Defaults to None.
+        """
+        
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics
+        
+        # Keep alive connections, shared by all threads
+        self.session = requests.Session ()
+        adapter = HTTPAdapter (pool_connections=1, pool_maxsize=10)
+        self.session.mount ("http://", adapter)
+        self.session.mount ("https://", adapter)
+        
+        # Send token in header, to keep it out of urls and logs
+        self.session.headers["Authorization"] = f"Token {TOKEN}"
+        
+        self.outbox = None
+        
+        # Validators of the last donations response, for conditional requests
+        self.donations_etag = None
+        self.donations_modified = None
 
-    def __requests_url__(self, endpoint: str) -> requests.get:
-        """ Request data from specific endpoint and and quit if error happens
+    def __requests_url__(self, endpoint: str, headers:dict=None) -> requests.Response:
+        """ Request data from specific endpoint, retrying connection and server errors
 
         Args:
             endpoint (str): endpoint to request, like "users" or "settings"
+            headers (dict, optional): extra request headers. Defaults to None.
+
+        Raises:
+            ApiConnectionError: backend not reachable after all retries
+            ApiResponseError: backend answer with an error status code
 
         Returns:
-            requests.get: response of requests to the endpoint
+            requests.Response: response of requests to the endpoint
         """
 
-        # Request data to specific url
-        url = f"{API_HOST}/{endpoint}/?token={TOKEN}"
-        res = requests.get(url)
+        url = f"{API_HOST}/{endpoint}/"
+        
+        for attempt in range (self.retries + 1):
+            last_attempt = attempt == self.retries
+            
+            # Request data to specific url
+            start = perf_counter ()
+            try:
+                res = self.session.get (url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                self.__record__ (endpoint, start, "error")
+                if last_attempt:
+                    raise ApiConnectionError (f"Error connecting to API '{endpoint}': {error}") from error
+            else:
+                self.__record__ (endpoint, start, res.status_code)
+                if res.status_code in [200, 304]:
+                    return res
+                
+                # Only retry server errors
+                if res.status_code < 500 or last_attempt:
+                    raise ApiResponseError (endpoint, res.status_code)
+            
+            # Exponential backoff with full jitter
+            sleep (random.uniform (0, self.backoff * 2 ** attempt))
 
-        if res.status_code == 200:
-            return res
-        else:
-            print("Error requesting data from API. Check your token.")
-            quit()
+    def __record__ (self, endpoint:str, start:float, status):
+        """ Save request duration and status in metrics
 
-    def get_donations(self) -> dict:
+        Args:
+            endpoint (str): requested endpoint
+            start (float): perf counter before request
+            status (int or str): response status code, or "error"
+        """
+        
+        if not self.metrics:
+            return None
+        
+        # Group endpoints without ids or names, like "update-donation"
+        endpoint = endpoint.split ("/")[0]
+        self.metrics.observe ("api_request_seconds", perf_counter () - start, endpoint=endpoint)
+        self.metrics.inc ("api_requests_total", endpoint=endpoint, status=status)
+
+    def get_donations(self, conditional:bool=False) -> dict:
         """ Get donations of the current live streams in comunidad mc, using the API
 
+        Args:
+            conditional (bool, optional): send validators of the last response 
+                (ETag / Last-Modified), to skip the download if nothing changed. Defaults to False.
+
         Returns:
-            dict: donations data.
+            dict: donations data, or None in conditional mode if donations didn't change.
 
             Example:
             {
@@ -49,10 +145,22 @@ class Api ():
             }
         """
 
-        print("getting donations...")
+        headers = {}
+        if conditional:
+            if self.donations_etag:
+                headers["If-None-Match"] = self.donations_etag
+            if self.donations_modified:
+                headers["If-Modified-Since"] = self.donations_modified
+        else:
+            print("getting donations...")
 
         # Get data from api
-        res = self.__requests_url__("donations")
+        res = self.__requests_url__("donations", headers=headers)
+        if res.status_code == 304:
+            return None
+        
+        self.donations_etag = res.headers.get ("ETag")
+        self.donations_modified = res.headers.get ("Last-Modified")
         return res.json()
     
     def set_donation_done (self, id:int) -> str:
@@ -83,6 +191,87 @@ class Api ():
         res = self.__requests_url__(endpoint)
         return res.text  
     
+    def start_outbox (self, path:str=OUTBOX_PATH):
+        """ Start background delivery of queued status updates. 
+        Pending updates of old runs are sent first
+
+        Args:
+            path (str, optional): sqlite outbox file. Defaults to OUTBOX_PATH.
+        """
+        
+        self.outbox = Outbox (path, self.__deliver__)
+        
+    def queue_donation_done (self, id:int):
+        """ Save in outbox the update of donation status to done
+
+        Args:
+            id (int): donation id
+        """
+        
+        self.outbox.put ("donation_done", id)
+        
+    def queue_disable_user (self, name:str):
+        """ Save in outbox the disable of user / bot
+
+        Args:
+            name (str): bot name
+        """
+        
+        self.outbox.put ("disable_user", name)
+        
+    def queue_disable_users (self, names:list):
+        """ Save in outbox the disable of many users / bots at once
+
+        Args:
+            names (list): bot names
+        """
+        
+        self.outbox.put_many ("disable_user", names)
+        
+    def __deliver__ (self, kind:str, value:str) -> bool:
+        """ Send outbox message to backend
+
+        Args:
+            kind (str): message type: "donation_done" or "disable_user"
+            value (str): donation id or bot name
+
+        Raises:
+            ValueError: message rejected by backend, it should not be retried
+
+        Returns:
+            bool: True if delivered, False to retry later
+        """
+        
+        requests_methods = {
+            "donation_done": (self.set_donation_done, "Donation updated"),
+            "disable_user": (self.disable_user, "User disabled"),
+        }
+        if kind not in requests_methods:
+            raise ValueError ("unknown outbox message")
+        request_method, expected_response = requests_methods[kind]
+        
+        try:
+            response = request_method (value)
+        except ApiConnectionError:
+            return False
+        except ApiResponseError as error:
+            
+            # Server errors, auth not accepted yet, timeouts and throttling can be solved later
+            if error.status_code >= 500 or error.status_code in RETRY_STATUS_CODES:
+                return False
+            raise ValueError (str (error))
+        
+        if response != expected_response:
+            raise ValueError (f"unexpected response: {response}")
+        return True
+    
+    def close (self):
+        """ Stop outbox, delivering pending updates
+        """
+        
+        if self.outbox:
+            self.outbox.close ()
+    
         
 if __name__ == "__main__":
     api = Api()
@@ -0,0 +1,337 @@
+""" End to end benchmark of the bot, without twitch accounts or the backend
+
+A fake backend (donations, updates and disable user endpoints, with latency
+and errors) and a static chat page are served locally. The bot runs in a
+subprocess with headless chrome, and external hosts blocked
+
+Run from project folder: python -m benchmarks.cheers --scenarios 10,100,1000
+"""
+
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import subprocess
+from time import sleep, time
+from threading import Thread, Lock
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psutil
+
+from credentials import CHROME_PATH, PORT
+
+PROJECT_DIR = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+
+# Chat page with the same selectors of Bot.selectors
+CHAT_PAGE = """<!DOCTYPE html>
+<html>
+<body>
+    <textarea data-a-target="chat-input"></textarea>
+    <button data-a-target="chat-send-button"
+        onclick="document.querySelector ('[data-a-target=chat-input]').value = ''">Chat</button>
+</body>
+</html>
+"""
+
+
+class FakeBackend ():
+
+    def __init__ (self, latency:float=0, error_rate:float=0):
+        """ Local stand-in of the backend api, and the chat pages
+
+        Args:
+            latency (float, optional): seconds to wait before each api response. Defaults to 0.
+            error_rate (float, optional): part of api requests answered with status 500. Defaults to 0.
+        """
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = Lock ()
+
+        # Donations to return, updates and disabled users received, and injected errors
+        self.donations = []
+        self.updated = {}
+        self.disabled = []
+        self.errors = 0
+
+        backend = self
+
+        class Handler (BaseHTTPRequestHandler):
+
+            def do_GET (self):
+                backend.__handle__ (self)
+
+            def log_message (self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer (("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        Thread (target=self.server.serve_forever, daemon=True).start ()
+
+    def __handle__ (self, request:BaseHTTPRequestHandler):
+        """ Answer api and chat page requests
+
+        Args:
+            request (BaseHTTPRequestHandler): current request
+        """
+
+        parts = [part for part in request.path.split ("?")[0].split ("/") if part]
+
+        # Static chat page, without latency or errors
+        if parts[:1] == ["popout"]:
+            self.__send__ (request, 200, CHAT_PAGE, "text/html")
+            return None
+
+        sleep (self.latency)
+        if random.random () < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            self.__send__ (request, 500, "Server error")
+            return None
+
+        if parts == ["donations"]:
+            self.__send__ (request, 200, json.dumps ({"donations": self.donations}), "application/json")
+        elif len (parts) == 2 and parts[0] == "update-donation":
+            with self.lock:
+                self.updated[int (parts[1])] = time ()
+            self.__send__ (request, 200, "Donation updated")
+        elif len (parts) == 2 and parts[0] == "disable-user":
+            with self.lock:
+                self.disabled.append (parts[1])
+            self.__send__ (request, 200, "User disabled")
+        else:
+            self.__send__ (request, 404, "Not found")
+
+    def __send__ (self, request:BaseHTTPRequestHandler, status:int, body:str, content_type:str="text/plain"):
+        """ Write response
+
+        Args:
+            request (BaseHTTPRequestHandler): current request
+            status (int): status code
+            body (str): response body
+            content_type (str, optional): content type. Defaults to "text/plain".
+        """
+
+        body = body.encode ()
+        request.send_response (status)
+        request.send_header ("Content-Type", content_type)
+        request.send_header ("Content-Length", str (len (body)))
+        request.end_headers ()
+        request.wfile.write (body)
+
+    def close (self):
+        """ Stop server
+        """
+
+        self.server.shutdown ()
+        self.server.server_close ()
+
+
+def get_donations (total:int, port:int, lead:float, spacing:float, streamers:int) -> list:
+    """ Generate donations to the local chat pages
+
+    Args:
+        total (int): number of donations
+        port (int): fake backend port
+        lead (float): seconds before the first donation
+        spacing (float): seconds between donations
+        streamers (int): number of different chats
+
+    Returns:
+        list: donations in the api format
+    """
+
+    start = datetime.now () + timedelta (seconds=lead)
+    donations = []
+    for index in range (total):
+        streamer = f"streamer{index % streamers}"
+        donation_time = start + timedelta (seconds=index * spacing)
+        donations.append ({
+            "id": index + 1,
+            "user": f"bot{index % 50}",
+            "admin": "benchmark",
+            "stream_chat_link": f"http://127.0.0.1:{port}/popout/{streamer}/chat?popout=",
+            "time": donation_time.strftime ("%H:%M:%S"),
+            "amount": 1,
+            "message": f"benchmark message {index + 1}",
+        })
+
+    return donations
+
+
+def get_headless_chrome (folder:str) -> str:
+    """ Write a launcher of headless chrome, with all external hosts blocked,
+    to use as CHROME_PATH of the bot
+
+    Args:
+        folder (str): folder of the launcher
+
+    Returns:
+        str: launcher path
+    """
+
+    flags = '--headless=new --host-resolver-rules="MAP * ~NOTFOUND, EXCLUDE 127.0.0.1"'
+    if os.name == "nt":
+        path = os.path.join (folder, "chrome.bat")
+        script = f'@"{CHROME_PATH}" {flags} %*\n'
+    else:
+        path = os.path.join (folder, "chrome.sh")
+        script = f'#!/bin/sh\nexec "{CHROME_PATH}" {flags} "$@"\n'
+
+    with open (path, "w") as file:
+        file.write (script)
+    os.chmod (path, 0o755)
+    return path
+
+
+def get_tree_rss (process:psutil.Process) -> int:
+    """ Memory of a process and its children (chrome instances)
+
+    Args:
+        process (psutil.Process): main process
+
+    Returns:
+        int: resident memory in bytes
+    """
+
+    rss = 0
+    try:
+        for item in [process] + process.children (recursive=True):
+            try:
+                rss += item.memory_info ().rss
+            except psutil.Error:
+                pass
+    except psutil.Error:
+        pass
+    return rss
+
+
+def percentile (values:list, percent:float) -> float:
+    """ Nearest rank percentile
+
+    Args:
+        values (list): numbers
+        percent (float): percentile, from 0 to 100
+
+    Returns:
+        float: percentile value, or 0 without values
+    """
+
+    if not values:
+        return 0
+    values = sorted (values)
+    index = max (round (percent / 100 * len (values)) - 1, 0)
+    return values[min (index, len (values) - 1)]
+
+
+def run_scenario (total:int, args:argparse.Namespace) -> dict:
+    """ Run the bot with a fake backend and generated donations
+
+    Args:
+        total (int): number of donations
+        args (argparse.Namespace): benchmark options
+
+    Returns:
+        dict: benchmark results
+    """
+
+    folder = tempfile.mkdtemp (prefix="twitch-cheer-bot-bench-")
+    traces_path = os.path.join (folder, "traces.jsonl")
+
+    backend = FakeBackend (latency=args.latency, error_rate=args.error_rate)
+    backend.donations = get_donations (total, backend.port, args.lead, args.spacing, args.streamers)
+
+    # Bot settings, isolated from the real outbox, journal and chrome profile
+    env = dict (os.environ)
+    env.update ({
+        "API_HOST": f"http://127.0.0.1:{backend.port}",
+        "TOKEN": "benchmark",
+        "CHROME_PATH": get_headless_chrome (folder),
+        "PORT": str (PORT + 100),
+        "DEBUG_MODE": "False",
+        "DAEMON_MODE": "False",
+        "DEBUG_USERS": "",
+        "OUTBOX_PATH": os.path.join (folder, "outbox.db"),
+        "JOURNAL_PATH": os.path.join (folder, "journal.db"),
+        "METRICS_PATH": os.path.join (folder, "metrics.prom"),
+        "TRACES_PATH": traces_path,
+        "METRICS_PORT": "0",
+    })
+
+    output = open (os.path.join (folder, "bot.log"), "w")
+    bot = subprocess.Popen (
+        [sys.executable, "__main__.py"],
+        cwd=PROJECT_DIR,
+        env=env,
+        stdout=output,
+        stderr=subprocess.STDOUT,
+    )
+
+    # Sample memory of bot and browsers until the end
+    process = psutil.Process (bot.pid)
+    peak_rss = 0
+    deadline = time () + args.lead + total * args.spacing + args.timeout
+    while bot.poll () is None:
+        peak_rss = max (peak_rss, get_tree_rss (process))
+        if time () > deadline:
+            bot.kill ()
+            break
+        sleep (0.5)
+    output.close ()
+    backend.close ()
+
+    traces = []
+    if os.path.exists (traces_path):
+        with open (traces_path) as file:
+            traces = [json.loads (line) for line in file if line.strip ()]
+
+    # Throughput from the first donation time to the end of the last one
+    submitted = [trace for trace in traces if trace.get ("result") == "submitted"]
+    cheers_per_minute = 0
+    if submitted:
+        window = max (trace["start"] + trace["duration"] for trace in submitted) - min (trace["fire_at"] for trace in submitted)
+        cheers_per_minute = len (submitted) / max (window, 1) * 60
+
+    lateness = [trace["send_lateness"] for trace in submitted if "send_lateness" in trace]
+    return {
+        "donations": total,
+        "submitted": len (submitted),
+        "updated": len (backend.updated),
+        "cheers_per_minute": cheers_per_minute,
+        "p50_lateness": percentile (lateness, 50),
+        "p99_lateness": percentile (lateness, 99),
+        "peak_rss": peak_rss / 1024 / 1024,
+        "api_errors": backend.errors,
+        "exit_code": bot.returncode,
+        "folder": folder,
+    }
+
+
+def main ():
+
+    parser = argparse.ArgumentParser (description="End to end benchmark of the bot")
+    parser.add_argument ("--scenarios", default="10,100,1000", help="donations of each scenario")
+    parser.add_argument ("--lead", type=float, default=20, help="seconds before the first donation")
+    parser.add_argument ("--spacing", type=float, default=1, help="seconds between donations")
+    parser.add_argument ("--streamers", type=int, default=5, help="number of different chats")
+    parser.add_argument ("--latency", type=float, default=0.05, help="seconds of each api response")
+    parser.add_argument ("--error-rate", type=float, default=0.05, help="part of api requests with status 500")
+    parser.add_argument ("--timeout", type=float, default=300, help="extra seconds before stop the bot")
+    args = parser.parse_args ()
+
+    print (f"{'donations':>10}{'submitted':>11}{'updated':>9}{'cheers/min':>12}"
+           f"{'p50 late (s)':>14}{'p99 late (s)':>14}{'peak RSS (MB)':>15}{'api errors':>12}")
+    for total in [int (value) for value in args.scenarios.split (",")]:
+        result = run_scenario (total, args)
+        print (f"{result['donations']:>10}{result['submitted']:>11}{result['updated']:>9}"
+               f"{result['cheers_per_minute']:>12.1f}{result['p50_lateness']:>14.2f}"
+               f"{result['p99_lateness']:>14.2f}{result['peak_rss']:>15.0f}{result['api_errors']:>12}")
+        if result["exit_code"]:
+            print (f"    bot exit code {result['exit_code']}, log in {result['folder']}")
+
+
+if __name__ == "__main__":
+    main ()
@@ -0,0 +1,77 @@
+""" Compare typing modes of ChromDevWrapper.send_data
+
+Run from project folder: python -m benchmarks.send_data
+"""
+
+from time import perf_counter
+
+from chrome_dev.chrome_dev import ChromDevWrapper
+from chrome_dev.browser_pool import get_profile_dir
+from credentials import CHROME_PATH, PORT
+
+MODES = ["keys", "chunked", "insert"]
+LENGTHS = [10, 50, 200, 500]
+PAGE = "data:text/html,<textarea id='chat'></textarea>"
+
+
+def count_round_trips (scraper:ChromDevWrapper) -> dict:
+    """ Count round trips (blocking waits for a command result) and
+    websocket messages sent to chrome
+
+    Args:
+        scraper (ChromDevWrapper): chrome dev wrapper instance
+
+    Returns:
+        dict: counters "round_trips" and "sent", updated in each wait and message
+    """
+
+    counters = {"round_trips": 0, "sent": 0}
+    send = scraper.chrome.ws.send
+    wait_result = scraper.chrome.wait_result
+
+    def counted_send (*args, **kwargs):
+        counters["sent"] += 1
+        return send (*args, **kwargs)
+
+    def counted_wait_result (*args, **kwargs):
+        counters["round_trips"] += 1
+        return wait_result (*args, **kwargs)
+
+    scraper.chrome.ws.send = counted_send
+    scraper.chrome.wait_result = counted_wait_result
+    return counters
+
+
+def main ():
+
+    # Separated chrome instance, to don't kill user windows
+    port = PORT + 100
+    scraper = ChromDevWrapper (
+        chrome_path=CHROME_PATH,
+        port=port,
+        start_killing=False,
+        user_data_dir=get_profile_dir (port),
+    )
+    scraper.set_page (PAGE)
+    counters = count_round_trips (scraper)
+
+    print (f"{'mode':<10}{'length':>8}{'round trips':>14}{'sent':>8}{'time (ms)':>12}{'typed ok':>10}")
+    for mode in MODES:
+        for length in LENGTHS:
+            message = ("cheer100 hola " * length)[:length]
+            scraper.execute_script ("document.querySelector ('#chat').value = ''")
+
+            counters["round_trips"] = counters["sent"] = 0
+            start = perf_counter ()
+            scraper.send_data ("#chat", message, mode=mode)
+            elapsed = (perf_counter () - start) * 1000
+
+            typed = scraper.execute_script ("document.querySelector ('#chat').value")
+            print (f"{mode:<10}{length:>8}{counters['round_trips']:>14}{counters['sent']:>8}"
+                   f"{elapsed:>12.1f}{str (typed == message):>10}")
+
+    scraper.close ()
+
+
+if __name__ == "__main__":
+    main ()
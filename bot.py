@@ -1,21 +1,43 @@
 import sys
-from time import sleep
-from datetime import datetime
-from threading import Thread
-from random import randint
+import asyncio
+import traceback
+from time import sleep, perf_counter, monotonic, time as now_timestamp
+from datetime import datetime, timedelta
+from threading import Thread, Lock
 
-from api import Api
+from api import Api, ApiError
+from metrics import Metrics, Instrumented
+from sessions import SessionManager
+from claims import Coordinator
+from journal import Journal, SCHEDULED, STARTED, TYPED, SUBMITTED, CONFIRMED, REPORTED, SKIPPED, SENT_STATES
+from scheduler import Scheduler
+from rate_limiter import RateLimiter
 from chrome_dev.chrome_dev import ChromDevWrapper
-from credentials import PORT, DEBUG_USERS, DEBUG_MODE, CHROME_PATH
+from chrome_dev.browser_pool import BrowserPool, get_profile_dir
+from chrome_dev.async_chrome_dev import AsyncChromDevWrapper
+from chrome_dev.block_profiles import get_blocked_urls
+from chrome_dev.chat_tabs import ChatTabs
+from credentials import PORT, DEBUG_USERS, DEBUG_MODE, CHROME_PATH, WORKERS
+from credentials import BROWSERS, BROWSER_MAX_USES, BROWSER_MAX_MEMORY, TYPING_MODE
+from credentials import ASYNC_MODE, DAEMON_MODE, POLL_MIN_INTERVAL, POLL_MAX_INTERVAL, JOURNAL_PATH
+from credentials import SESSION_TTL, BROWSER_CONTEXTS, BLOCK_PROFILE, BLOCKED_URLS
+from credentials import METRICS_PATH, METRICS_PORT, TRACES_PATH, PRESTAGE_TIME
+from credentials import NODE_ID, CLAIMS_PATH, PARTITION_BY, LEASE_TIME, CHAT_TABS
+from credentials import HEADLESS, TAB_MAX_MEMORY, PREFLIGHT_WORKERS
+from credentials import CHAT_RATE, CHAT_BURST, USER_RATE, USER_BURST, GLOBAL_RATE, GLOBAL_BURST
+
+# Max time before midnight to read early donation times as tomorrow ones
+ROLLOVER_WINDOW = timedelta (hours=1)
 
 class Bot ():
     
     def __init__ (self): 
-        """ Start threads to send donations to twitch chat
+        """ Schedule donations and send them to twitch chat
         """
          
         # variables
-        self.api = Api()
+        self.metrics = Metrics (METRICS_PATH, TRACES_PATH, METRICS_PORT)
+        self.api = Api (metrics=self.metrics)
         self.selectors = {
             'twitch_login_input': '#login-username',
             'comment_textarea': '[data-a-target="chat-input"]',
@@ -27,11 +49,67 @@ class Bot ():
             'comment_warning_before': '[data-test-selector="chat-rules-ok-button"]',
             'comment_warning_after': '[data-test-selector="full-error"], [data-test-selector="inline-error"]',
         }
-        self.running = False
+        self.error_lock = Lock ()
         self.error = False
+        self.cookies = {}
+        self.fire_times = {}
+        self.deadlines = {}
+        self.partitions = {}
+        self.unclaimed = set ()
+        self.scheduled = set ()
+        self.chat_keys = {}
+        self.invalid_users = set ()
+        self.chat_tabs = ChatTabs (CHAT_TABS)
+        self.blocked_urls = get_blocked_urls (BLOCK_PROFILE, urls=BLOCKED_URLS)
+        self.sessions = SessionManager (ttl=SESSION_TTL)
+        self.scheduler = None
+        
+        # Pace cheers by chat, bot and globally (under twitch chat rate limits)
+        self.rate_limiter = RateLimiter ({
+            "chat": (CHAT_RATE, CHAT_BURST),
+            "user": (USER_RATE, USER_BURST),
+            "global": (GLOBAL_RATE, GLOBAL_BURST),
+        }, self.metrics)
+        
+        # Send status updates in background (and the pending ones of old runs)
+        self.api.start_outbox ()
+        
+        # Donation states of this and old runs (only in memory for debug)
+        self.journal = Journal (":memory:" if DEBUG_MODE else JOURNAL_PATH)
+        
+        # Share donations with other nodes, by partition leases
+        self.coordinator = None
+        if NODE_ID:
+            self.coordinator = Coordinator (CLAIMS_PATH, NODE_ID, LEASE_TIME)
+        
+        if DAEMON_MODE:
+            
+            # The live schedule of daemon mode only runs in threads
+            if ASYNC_MODE:
+                self.__show_message__ ("ASYNC_MODE is not supported in daemon mode, running donations in threads")
+            self.__run_daemon__ ()
+        else:
+            self.__run_once__ ()
+        self.api.close ()
+        self.journal.close ()
+        self.metrics.save ()
+        if self.coordinator:
+            self.coordinator.close ()
+            
+        # Raise error when end
+        if self.error:
+            sys.exit (1)
+            
+    def __run_once__ (self):
+        """ Get donations and submit each one when its time arrives
+        """
         
         # Get data from api
-        data = self.api.get_donations()
+        try:
+            data = self.api.get_donations()
+        except ApiError as error:
+            self.__show_message__ (f"{error}. Check your token.", is_error=True)
+            sys.exit (1)
         donations = data["donations"]
         print ()
         
@@ -39,13 +117,47 @@ class Bot ():
             self.__show_message__ ("No donations to send")
             return None
         
-        # Submit each donation
-        threads = []
+        # Submit each donation when its time arrives
+        jobs = self.__get_jobs__ (donations)
+        if ASYNC_MODE:
+            asyncio.run (self.__run_async__ (jobs))
+        else:
+            self.__run__ (jobs)
+            
+    def __get_jobs__ (self, donations:list) -> dict:
+        """ Filter and validate donations, and convert them to scheduler jobs
+
+        Args:
+            donations (list): donations data from api
+
+        Returns:
+            dict: tuples of fire timestamp and submit_donation args, by donation id
+        """
+        
+        jobs = {}
+        retried = self.unclaimed
+        self.unclaimed = set ()
+        donation_ids = [donation["id"] for donation in donations]
+        states = self.journal.get_states (donation_ids)
+        sent = self.coordinator.get_sent (donation_ids) if self.coordinator else set ()
         for donation in donations:
             
             if DEBUG_USERS and donation["user"] not in DEBUG_USERS:
                 continue
             
+            # Skip donations already sent in old runs, and report them again
+            state = states.get (donation["id"])
+            if state in SENT_STATES:
+                self.__show_message__ (f"already sent ({state}), skipped", donation["id"])
+                if state != REPORTED:
+                    self.__update_status__ (donation["id"])
+                continue
+            
+            # Skip donations already sent by other nodes
+            if donation["id"] in sent:
+                self.__show_message__ ("already sent by other node, skipped", donation["id"])
+                continue
+            
             # Format data
             id = donation["id"]
             user = donation["user"]
@@ -57,25 +169,267 @@ class Bot ():
             # Get streamer name
             streamer = stream_chat_link.split("/")[4]
             
-            # Show donation data       
-            self.__show_message__ (f"bot: '{user}', time: {time}, stramer: '{streamer}', message: '{message}', amount: {amount}", donation["id"]) 
+            # Show donation data (once for donations of partitions of other nodes)
+            if id not in retried:
+                self.__show_message__ (f"bot: '{user}', time: {time}, stramer: '{streamer}', message: '{message}', amount: {amount}", donation["id"]) 
+            
+            # Save bot cookies, for login (new cookies can fix a disabled bot)
+            if donation.get ("cookies"):
+                if self.cookies.get (user) != donation["cookies"]:
+                    self.invalid_users.discard (user)
+                self.cookies[user] = donation["cookies"]
+            
+            # Validate lost donation times
+            donation_time = self.__get_donation_time__ (time)
+            if datetime.now () > donation_time:
+                self.__show_message__ ("time lost", id, is_error=True)
+                continue
+            
+            # Only run donations of the partitions owned by this node
+            partition = f"{PARTITION_BY}:{user if PARTITION_BY == 'user' else streamer}"
+            if self.coordinator and not self.coordinator.claim (partition):
+                if id not in retried:
+                    self.__show_message__ (f"partition '{partition}' claimed by other node, skipped", id)
+                self.unclaimed.add (id)
+                continue
+            self.partitions[id] = partition
+            
+            # Group donations of the same bot and chat, to reuse chat tabs
+            self.chat_keys[id] = (user, stream_chat_link)
+            
+            jobs[id] = (donation_time.timestamp(), id, stream_chat_link, user, message, amount)
+            self.fire_times[id] = donation_time.timestamp()
+            self.journal.record (id, SCHEDULED)
+            
+        return jobs
+    
+    def __start_preflight__ (self, jobs:dict):
+        """ Validate bot sessions in background, before the donations start
+        (after they are scheduled, to cancel the donations of invalid bots)
+
+        Args:
+            jobs (dict): tuples of fire timestamp and submit_donation args, by donation id
+        """
+        
+        Thread (target=self.__preflight__, args=(jobs,), daemon=True).start ()
+    
+    def __preflight__ (self, jobs:dict):
+        """ Validate sessions of all bots of the jobs at the same time, disable
+        the invalid bots in a single batch and skip their donations
+
+        Args:
+            jobs (dict): tuples of fire timestamp and submit_donation args, by donation id
+        """
+        
+        # Bots with cookies (the chrome profile login is validated in the cheer)
+        donations_by_user = {}
+        for id, (_, _, _, user, _, _) in jobs.items ():
+            donations_by_user.setdefault (user, []).append (id)
+        sessions = {user: self.cookies[user] for user in donations_by_user if user in self.cookies}
+        
+        results = self.sessions.validate_all (sessions, workers=PREFLIGHT_WORKERS)
+        invalid = [user for user, valid in results.items () if not valid and user not in self.invalid_users]
+        if not invalid:
+            return None
+        
+        self.invalid_users.update (invalid)
+        self.__show_message__ (f"invalid sessions of bots: {', '.join (invalid)}", is_error=True)
+        self.api.queue_disable_users (invalid)
+        
+        # Cancel donations of invalid bots before their time, to free workers and rate limits
+        for user in invalid:
+            for id in donations_by_user[user]:
+                if self.scheduler and self.scheduler.cancel (id):
+                    self.__forget_donation__ (id)
+                    self.scheduled.discard (id)
+                self.__skip_donation__ (id, user)
+                
+    def __skip_donation__ (self, id:int, user:str):
+        """ Mark scheduled donation of an invalid bot as skipped
+
+        Args:
+            id (int): donation id
+            user (str): bot name
+        """
+        
+        if self.journal.get_state (id) == SCHEDULED:
+            self.journal.record (id, SKIPPED)
+            self.__show_message__ (f"bot '{user}' disabled, donation skipped", id, is_error=True)
+        
+    def __start_workers__ (self):
+        """ Start browsers and scheduler
+        """
+        
+        self.browser_pool = BrowserPool (
+            chrome_path=CHROME_PATH,
+            size=BROWSERS,
+            base_port=PORT,
+            max_uses=BROWSER_MAX_USES,
+            max_memory=BROWSER_MAX_MEMORY,
+            slots=max (BROWSER_CONTEXTS, 1),
+            blocked_urls=self.blocked_urls,
+            headless=HEADLESS,
+        )
+        self.scheduler = Scheduler (workers=WORKERS, limiter=self.rate_limiter)
+        
+    def __get_limits__ (self, stream_chat_link:str, user:str) -> dict:
+        """ Rate limit keys of a donation
+
+        Args:
+            stream_chat_link (str): link to the chat of the stream
+            user (str): bot name
+
+        Returns:
+            dict: bucket key by scope
+        """
+        
+        return {"chat": stream_chat_link, "user": user, "global": ""}
+        
+    def __run__ (self, jobs:dict):
+        """ Start browsers and schedule donations in threads, starting each one
+        PRESTAGE_TIME seconds before its time (or later, paced by rate limits)
+
+        Args:
+            jobs (dict): tuples of fire timestamp and submit_donation args, by donation id
+        """
+        
+        self.__start_workers__ ()
+        for id, (fire_at, *args) in jobs.items ():
+            limits = self.__get_limits__ (args[1], args[2])
+            self.scheduler.schedule (fire_at - PRESTAGE_TIME, self.submit_donation, *args, key=id, limits=limits)
+        self.__start_preflight__ (jobs)
             
-            # Submit donation with thread
-            thread = Thread (target=self.submit_donation, args=(id, stream_chat_link, user, time, message, amount))
-            thread.start()
-            threads.append (thread)
+        # Wait for donations to end
+        self.scheduler.join ()
+        self.browser_pool.close ()
+        
+    def __run_daemon__ (self):
+        """ Keep running, polling donations in an adaptive interval and merging
+        new, changed and cancelled donations in the live schedule
+        """
+        
+        self.__start_workers__ ()
+        self.donations = {}
+        interval = POLL_MIN_INTERVAL
+        
+        self.__show_message__ ("daemon mode started, press Ctrl+C to stop")
+        try:
+            while True:
+                
+                # Request donations only if they changed since last poll, 
+                # or to take over partitions of other nodes
+                changed = False
+                try:
+                    data = self.api.get_donations (conditional=not self.unclaimed)
+                    if data is not None:
+                        changed = self.__merge_donations__ (data["donations"])
+                except ApiError as error:
+                    self.__show_message__ (str (error), is_error=True)
+                
+                # Poll faster after changes, and slower while idle
+                if changed:
+                    interval = POLL_MIN_INTERVAL
+                else:
+                    interval = min (interval * 2, POLL_MAX_INTERVAL)
+                sleep (interval)
+                
+        except KeyboardInterrupt:
+            self.__show_message__ ("stopping daemon...")
+        finally:
+            self.scheduler.stop ()
+            self.browser_pool.close ()
             
-        # Wait for threads to end
-        while True:
-            if threads and any ([thread.is_alive() for thread in threads]):
-                sleep (1)
+    def __merge_donations__ (self, donations:list) -> bool:
+        """ Update schedule with the differences between current donations and the
+        already known ones. Donations already running or sent are not changed
+
+        Args:
+            donations (list): donations data from api
+
+        Returns:
+            bool: True if there are new, changed or cancelled donations
+        """
+        
+        current = {donation["id"]: donation for donation in donations}
+        changed = False
+        
+        # Cancel donations removed from backend
+        for id in list (self.donations):
+            if id not in current:
+                del self.donations[id]
+                changed = True
+                if self.scheduler.cancel (id):
+                    self.__forget_donation__ (id)
+                    self.scheduled.discard (id)
+                    self.__show_message__ ("cancelled", id)
+        
+        # Find new donations, and changed donations not started yet (not scheduled
+        # ones, like time lost, are only validated again when they change)
+        updated = []
+        for id, donation in current.items ():
+            if self.donations.get (id) == donation:
+                
+                # Try again to take over partitions of other nodes
+                if id in self.unclaimed:
+                    updated.append (donation)
                 continue
             
-            # Raise error when end
-            if self.error:
-                sys.exit (1)
+            changed = True
+            self.donations[id] = donation
+            if id not in self.scheduled or self.scheduler.cancel (id):
+                self.__forget_donation__ (id)
+                self.scheduled.discard (id)
+                updated.append (donation)
+        
+        # Schedule new versions (running or sent donations keep their version)
+        jobs = self.__get_jobs__ (updated)
+        for id, (fire_at, *args) in jobs.items ():
+            limits = self.__get_limits__ (args[1], args[2])
+            self.scheduler.schedule (fire_at - PRESTAGE_TIME, self.submit_donation, *args, key=id, limits=limits)
+            self.scheduled.add (id)
+        if jobs:
+            self.__start_preflight__ (jobs)
+            
+        return changed
+        
+    async def __run_async__ (self, jobs:dict):
+        """ Start browsers and run all donations as coroutines in a single event loop
 
-            break
+        Args:
+            jobs (dict): tuples of fire timestamp and submit_donation args, by donation id
+        """
+        
+        self.__start_preflight__ (jobs)
+        
+        # Browsers available for donations (one time by context slot)
+        browsers = asyncio.Queue ()
+        started_browsers = []
+        for index in range (BROWSERS):
+            port = PORT + index
+            browser = await AsyncChromDevWrapper.create (
+                chrome_path=CHROME_PATH,
+                port=port,
+                start_killing=True,
+                user_data_dir=get_profile_dir (port),
+                blocked_urls=self.blocked_urls,
+                headless=HEADLESS,
+            )
+            started_browsers.append (browser)
+            for _ in range (max (BROWSER_CONTEXTS, 1)):
+                browsers.put_nowait (browser)
+            
+        results = await asyncio.gather (*[
+            self.submit_donation_async (browsers, fire_at, *args)
+            for fire_at, *args in jobs.values ()
+        ], return_exceptions=True)
+        
+        # Show errors without stopping other donations
+        for result in results:
+            if isinstance (result, Exception):
+                traceback.print_exception (result)
+        
+        for browser in started_browsers:
+            await browser.close (kill_chrome=True)
         
     def __show_message__ (self, message:str, id:int=0, is_error:bool=False):
         """ print error message
@@ -89,15 +443,51 @@ class Bot ():
         prefix = "Info: "
         if is_error:
             prefix = "Error: "
-            self.error = True
+            with self.error_lock:
+                self.error = True
             
         if id != 0:
             prefix += f"Donation {id}: "
         
         print (f"{prefix}{message}")
         
+    def __show_page_stats__ (self, id:int, page_stats:dict):
+        """ Show network usage of the page load
+
+        Args:
+            id (int): donation id
+            page_stats (dict): requests, bytes and blocked requests, from the scraper
+        """
+        
+        if not page_stats:
+            return None
+        
+        kilobytes = page_stats["bytes"] / 1024
+        self.__show_message__ (f"chat loaded: {page_stats['requests']} requests, {kilobytes:.0f} KB, {page_stats['blocked']} blocked", id)
+        
+    def __get_donation_time__ (self, time_str:str) -> datetime:
+        """ Convert donation time text to datetime: today, or tomorrow for times
+        of the next day close to midnight (like 00:10 received at 23:50)
+
+        Args:
+            time_str (str): time text in format "hh:mm:ss"
+
+        Returns:
+            datetime: donation date and time
+        """
+        
+        donation_time = datetime.strptime (time_str, "%H:%M:%S")
+        now = datetime.now ()
+        donation_time = donation_time.replace (year=now.year, month=now.month, day=now.day)
+        
+        # Midnight rollover (older times are lost, not sent the next day)
+        tomorrow_time = donation_time + timedelta (days=1)
+        if now > donation_time and tomorrow_time - now <= ROLLOVER_WINDOW:
+            donation_time = tomorrow_time
+        return donation_time
+        
     def __login__ (self, id:int, user:str, scraper:ChromDevWrapper)-> bool:
-        """ Validate login in twitch
+        """ Set bot cookies and validate login in twitch
 
         Args:
             id (int): donation id
@@ -108,30 +498,76 @@ class Bot ():
             bool: True if the login was successful
         """
         
-        logged = True
+        # Login with cookies, and validate session without load twitch
+        cookies = self.cookies.get (user)
+        if cookies:
+            scraper.delete_cookies ()
+            scraper.set_cookies (cookies)
+            logged = self.sessions.validate (user, cookies)
+            return self.__check_login__ (id, user, logged)
         
-        # Validate login
+        # Validate login of the current chrome profile (without cookies of other bots)
+        scraper.delete_cookies ()
         scraper.set_page ("https://www.twitch.tv/login")    
+        scraper.wait_for_network_idle (timeout=5)
         login_input_visible = scraper.count_elems (self.selectors["twitch_login_input"])
-        if login_input_visible:
+        return self.__check_login__ (id, user, not login_input_visible)
+    
+    async def __login_async__ (self, id:int, user:str, scraper:AsyncChromDevWrapper)-> bool:
+        """ Validate login in twitch, with asyncio wrapper
+
+        Args:
+            id (int): donation id
+            user (str): bot name
+            scraper (AsyncChromDevWrapper): asyncio chrome dev wrapper instance
+
+        Returns:
+            bool: True if the login was successful
+        """
+        
+        cookies = self.cookies.get (user)
+        if cookies:
+            await scraper.delete_cookies ()
+            await scraper.set_cookies (cookies)
+            logged = await asyncio.to_thread (self.sessions.validate, user, cookies)
+            return await asyncio.to_thread (self.__check_login__, id, user, logged)
+        
+        await scraper.delete_cookies ()
+        await scraper.set_page ("https://www.twitch.tv/login")    
+        await scraper.wait_for_network_idle (timeout=5)
+        login_input_visible = await scraper.count_elems (self.selectors["twitch_login_input"])
+        return await asyncio.to_thread (self.__check_login__, id, user, not login_input_visible)
+    
+    def __check_login__ (self, id:int, user:str, logged:bool) -> bool:
+        """ Show error and disable bot if the login is not valid
+
+        Args:
+            id (int): donation id
+            user (str): bot name
+            logged (bool): login status
+
+        Returns:
+            bool: True if the login was successful
+        """
+        
+        if not logged:
             
             # Show error and update status
             self.__show_message__ (f"login error, bot: {user}", id, is_error=True)
-            logged = False
             
-            #  Disable user in
-            response = self.api.disable_user (user)
-            if response != "User disabled":
-                self.__show_message__ (f"bot {user} not disabled", id, is_error=True)
+            #  Disable user in backend (only once)
+            if user not in self.invalid_users:
+                self.invalid_users.add (user)
+                self.api.queue_disable_user (user)
                                        
         return logged 
     
-    def __validate_inputs__ (self, id:int, scraper:ChromDevWrapper) -> bool:
+    def __validate_inputs__ (self, id:int, snapshot:dict) -> bool:
         """ Validate if inputs are visible and available
 
         Args:
             id (int): donation id
-            scraper (ChromDevWrapper): chrome dev wrapper instance
+            snapshot (dict): page elements data, from ChromDevWrapper.probe
 
         Returns:
             bool: True if inputs are visible and available
@@ -140,26 +576,43 @@ class Bot ():
         inputs_valid = True
         
         # Validate if constrols are visible
-        comment_textarea_visible = scraper.count_elems (self.selectors["comment_textarea"])
-        comment_send_btn_visible = scraper.count_elems (self.selectors["comment_send_btn"])
+        comment_textarea_visible = snapshot["comment_textarea"]["count"]
+        comment_send_btn_visible = snapshot["comment_send_btn"]["count"]
         if not comment_textarea_visible or not comment_send_btn_visible:
             self.__show_message__ ("inputs not visible", id, is_error=True)
             inputs_valid = False
             
         # Validate error messages
-        warning_text = scraper.get_text (self.selectors["comment_warning_before"])
+        warning_text = snapshot["comment_warning_before"]["text"]
         if warning_text:
             self.__show_message__ (f"Inputs not available: {warning_text}", id, is_error=True)
             inputs_valid = False
             
         return inputs_valid
     
-    def __validate_submit__ (self, id:int, scraper:ChromDevWrapper) -> bool:
+    def __inputs_ready__ (self, snapshot:dict) -> bool:
+        """ Check without errors if inputs are visible and available, 
+        like in a reused chat tab
+
+        Args:
+            snapshot (dict): page elements data, from ChromDevWrapper.probe
+
+        Returns:
+            bool: True if inputs are visible and available
+        """
+        
+        return bool (
+            snapshot["comment_textarea"]["count"]
+            and snapshot["comment_send_btn"]["count"]
+            and not snapshot["comment_warning_before"]["text"]
+        )
+    
+    def __validate_submit__ (self, id:int, warning_text:str) -> bool:
         """ Validate if donation was send
 
         Args:
             id (int): donation id
-            scraper (ChromDevWrapper): chrome dev wrapper instance
+            warning_text (str): text of the warnings after submit
             
         Returns:
             bool: True if donation was send
@@ -167,7 +620,6 @@ class Bot ():
         
         donation_sent = True
         
-        warning_text = scraper.get_text (self.selectors["comment_warning_after"])
         if warning_text:
             self.__show_message__ (f"Donation not send: {warning_text}", id, is_error=True)
             donation_sent = False
@@ -175,100 +627,628 @@ class Bot ():
         return donation_sent
         
     def submit_donation (self, id:int, stream_chat_link:str, user:str,
-                         time_str:str, message:str, amount:int):
-        """ Send donation to twitch chat
+                         message:str, amount:int, delay:float=0):
+        """ Send donation to twitch chat, when a browser is available
 
         Args:
             id (int): donation id
             stream_chat_link (str): link to the chat of the stream
             user (str): bot name
-            time (str): time text in format "hh:mm:ss"
             message (str): message to send
             amount (int): bits of the donation
+            delay (float, optional): seconds the donation was delayed by rate limits. Defaults to 0.
         """
         
-        # Wait random seconds
-        sleep (randint (0, 15))
+        if not self.__can_start__ (id, user):
+            return None
+        
+        self.__start_trace__ (id, user, self.fire_times.get (id, now_timestamp ()), delay)
+        result = "error"
+        try:
+            
+            # Wait until other donations release a browser
+            wait_start = perf_counter ()
+            with self.browser_pool.lease () as browser:
+                self.metrics.add_span ("browser_wait", perf_counter () - wait_start)
                 
-        # Donation time
-        donation_time = datetime.strptime (time_str, "%H:%M:%S")
-        now = datetime.now ()
-        donation_time = donation_time.replace (year=now.year, month=now.month, day=now.day)
+                # Reuse the chat tab of the last cheer of the same bot and chat
+                key, scraper = self.__take_chat_tab__ (browser.port, user, stream_chat_link)
+                if scraper and not scraper.is_alive ():
+                    self.__close_contexts__ ([scraper])
+                    scraper = None
+                reused = scraper is not None
+                
+                if not scraper:
+                    scraper = self.__get_main_tab__ (browser) or browser.create_context ()
+                
+                closed = [scraper]
+                try:
+                    submitted = self.__cheer__ (id, stream_chat_link, user, message, amount, scraper, reused)
+                    result = "submitted" if submitted else "failed"
+                    
+                    # Report before keeping or closing the tab, to don't lose sent donations by tab errors
+                    if submitted:
+                        with self.metrics.span ("report"):
+                            self.__update_status__ (id)
+                    
+                    if self.__has_pending_chat__ (id, key):
+                        closed = self.__keep_chat_tab__ (id, key, scraper, scraper.get_tab_memory ())
+                finally:
+                    self.__close_contexts__ (closed)
+        finally:
+            self.__end_trace__ (id, result)
+            
+    async def submit_donation_async (self, browsers:asyncio.Queue, fire_at:float, id:int,
+                                     stream_chat_link:str, user:str, message:str, amount:int):
+        """ Wait for donation time and send donation to twitch chat, 
+        when a browser is available
+
+        Args:
+            browsers (asyncio.Queue): available AsyncChromDevWrapper instances
+            fire_at (float): donation unix timestamp
+            id (int): donation id
+            stream_chat_link (str): link to the chat of the stream
+            user (str): bot name
+            message (str): message to send
+            amount (int): bits of the donation
+        """
+        
+        await asyncio.sleep (max (fire_at - PRESTAGE_TIME - now_timestamp (), 0))
         
-        # Validate lost donation times
-        if now > donation_time:
-            self.__show_message__ ("time lost", id, is_error=True)
-            self.running = False
+        # Wait for rate limits (reserved without awaits, in start order)
+        limits = self.__get_limits__ (stream_chat_link, user)
+        delay = self.rate_limiter.reserve (limits, fire_at - PRESTAGE_TIME)
+        await asyncio.sleep (max (fire_at + delay - PRESTAGE_TIME - now_timestamp (), 0))
+        
+        # Journal, outbox and coordinator writes run in threads, to don't block other cheers
+        if not await asyncio.to_thread (self.__can_start__, id, user):
             return None
+        
+        self.__start_trace__ (id, user, fire_at, delay)
+        result = "error"
+        try:
+            
+            # Wait until other donations release a browser
+            wait_start = perf_counter ()
+            browser = await browsers.get ()
+            self.metrics.add_span ("browser_wait", perf_counter () - wait_start)
+            try:
                 
-        # Wait until donation time
-        while donation_time > now:
-            sleep (15)
-            now = datetime.now ()
-            
-        # Update status or wait until other donations are send
-        if not self.running: 
-            self.running = True
-        else:
-            while self.running:
-                sleep (randint (0, 5))
+                # Reuse the chat tab of the last cheer of the same bot and chat
+                key, scraper = self.__take_chat_tab__ (browser.port, user, stream_chat_link)
+                if scraper and not await scraper.is_alive ():
+                    await self.__close_contexts_async__ ([scraper])
+                    scraper = None
+                reused = scraper is not None
+                
+                if not scraper:
+                    scraper = self.__get_main_tab__ (browser) or await browser.create_context ()
+                
+                closed = [scraper]
+                try:
+                    submitted = await self.__cheer_async__ (id, stream_chat_link, user, message, amount, scraper, reused)
+                    result = "submitted" if submitted else "failed"
+                    
+                    # Report before keeping or closing the tab, to don't lose sent donations by tab errors
+                    if submitted:
+                        with self.metrics.span ("report"):
+                            await asyncio.to_thread (self.__update_status__, id)
+                    
+                    if self.__has_pending_chat__ (id, key):
+                        closed = self.__keep_chat_tab__ (id, key, scraper, await scraper.get_tab_memory ())
+                finally:
+                    await self.__close_contexts_async__ (closed)
+            finally:
+                
+                # Release only the slot taken by this donation
+                browsers.put_nowait (browser)
+        finally:
+            await asyncio.to_thread (self.__end_trace__, id, result)
+            
+    def __can_start__ (self, id:int, user:str) -> bool:
+        """ Skip donations already sent (duplicated in schedule), or of invalid bots
+
+        Args:
+            id (int): donation id
+            user (str): bot name
+
+        Returns:
+            bool: True if the donation can start
+        """
         
-        # Show start donation status 
-        self.__show_message__ ("starting...", id)
+        if self.journal.get_state (id) in SENT_STATES:
+            self.__forget_donation__ (id)
+            return False
         
-        # Connect to chrome
-        scraper = ChromDevWrapper(
-            chrome_path=CHROME_PATH,
-            port=PORT
-        )
+        if user in self.invalid_users:
+            self.__skip_donation__ (id, user)
+            self.__forget_donation__ (id)
+            return False
         
-        # Login in twitch and validate
-        logged = self.__login__ (id, user, scraper)
-        if not logged:
-            self.running = False
+        return True
+    
+    def __take_chat_tab__ (self, port:int, user:str, stream_chat_link:str) -> tuple:
+        """ Take the chat tab of the last cheer of the same bot and chat, in the browser
+
+        Args:
+            port (int): browser port
+            user (str): bot name
+            stream_chat_link (str): link to the chat of the stream
+
+        Returns:
+            tuple: chat tab key, and its scraper (None if there is no open chat tab)
+        """
+        
+        key = (port, user, stream_chat_link)
+        return key, self.chat_tabs.take (key)
+    
+    def __get_main_tab__ (self, browser):
+        """ Get the main tab of the browser, when cheers don't use isolated contexts
+
+        Args:
+            browser (ChromDevWrapper | AsyncChromDevWrapper): browser instance
+
+        Returns:
+            ChromDevWrapper | AsyncChromDevWrapper: browser main tab, or None 
+                to use a new isolated context (to run many bots in the same browser)
+        """
+        
+        if BROWSER_CONTEXTS:
             return None
+        
+        # The main tab will leave the chat of its last cheer
+        self.chat_tabs.discard_port (browser.port)
+        return browser
+    
+    def __keep_chat_tab__ (self, id:int, key:tuple, scraper, memory:int) -> list:
+        """ Keep tab for the next cheer of the same bot and chat, if it is not too heavy
+
+        Args:
+            id (int): donation id
+            key (tuple): browser port, bot name and chat link
+            scraper (ChromDevWrapper | AsyncChromDevWrapper): chat tab
+            memory (int): js heap of the tab in bytes
+
+        Returns:
+            list: tabs to close: tabs evicted from the cache, or the chat tab itself
+        """
+        
+        if not self.__tab_in_budget__ (id, memory):
+            return [scraper]
+        return self.chat_tabs.put (key, scraper)
+    
+    def __has_pending_chat__ (self, id:int, key:tuple) -> bool:
+        """ Check if other pending donation use the same bot and chat, 
+        to keep its chat tab open
+
+        Args:
+            id (int): donation id
+            key (tuple): browser port, bot name and chat link
+
+        Returns:
+            bool: True if the chat tab should be kept
+        """
+        
+        if not CHAT_TABS:
+            return False
+        
+        chat_key = key[1:]
+        return any (other != id and other_key == chat_key for other, other_key in list (self.chat_keys.items ()))
+    
+    def __tab_in_budget__ (self, id:int, memory:int) -> bool:
+        """ Validate tab memory with TAB_MAX_MEMORY, to recycle heavy tabs
+
+        Args:
+            id (int): donation id
+            memory (int): js heap of the tab in bytes
+
+        Returns:
+            bool: True if the tab can be kept open
+        """
+        
+        if TAB_MAX_MEMORY and memory > TAB_MAX_MEMORY * 1024 * 1024:
+            self.metrics.inc ("tabs_recycled_total")
+            self.__show_message__ (f"chat tab over memory budget ({memory / 1024 / 1024:.0f} MB), closed", id)
+            return False
+        return True
+    
+    def __close_contexts__ (self, scrapers:list):
+        """ Close isolated contexts of chat tabs (main tabs stay open)
+
+        Args:
+            scrapers (list): ChromDevWrapper instances
+        """
+        
+        for scraper in scrapers:
+            if scraper.context_id:
+                try:
+                    scraper.close_context ()
+                except Exception as error:
+                    print (f"Error closing browser context: {error}")
                     
-        # Go to chat page
-        scraper.set_page (stream_chat_link)
-        sleep (10)
+    async def __close_contexts_async__ (self, scrapers:list):
+        """ Close isolated contexts of chat tabs (main tabs stay open), with asyncio wrapper
+
+        Args:
+            scrapers (list): AsyncChromDevWrapper instances
+        """
         
-        # Validate inputs
-        inputs_valid = self.__validate_inputs__ (id, scraper)
-        if not inputs_valid:
-            self.running = False
+        for scraper in scrapers:
+            if scraper.context_id:
+                try:
+                    await scraper.close_context ()
+                except Exception as error:
+                    print (f"Error closing browser context: {error}")
+        
+    def __start_trace__ (self, id:int, user:str, fire_at:float, delay:float=0):
+        """ Start trace of the donation, save the scheduler lateness (actual 
+        start time minus scheduled start time) and arm the send click time
+
+        Args:
+            id (int): donation id
+            user (str): bot name
+            fire_at (float): donation unix timestamp
+            delay (float, optional): seconds the donation was delayed by rate limits. Defaults to 0.
+        """
+        
+        lateness = max (now_timestamp () - (fire_at + delay - PRESTAGE_TIME), 0)
+        self.metrics.observe ("schedule_lateness_seconds", lateness)
+        self.metrics.start_trace (id, user=user, fire_at=fire_at, lateness=round (lateness, 4), 
+                                  rate_wait=round (delay, 4))
+        
+        # Click time in monotonic clock, safe from system clock changes while preparing
+        self.deadlines[id] = monotonic () + fire_at + delay - now_timestamp ()
+        
+    def __get_fire_delay__ (self, id:int) -> float:
+        """ Get seconds to wait before the send click. When the preparation 
+        ended late, the donation is sent right away
+
+        Args:
+            id (int): donation id
+
+        Returns:
+            float: seconds until the donation time, or 0 if it already passed
+        """
+        
+        delay = self.deadlines.get (id, monotonic ()) - monotonic ()
+        if delay < 0:
+            self.__show_message__ (f"preparation ended {-delay:.1f}s late, sending now", id)
+        return max (delay, 0)
+        
+    def __record_send_lateness__ (self, id:int):
+        """ Save lateness of the click in send button (click time minus donation time)
+
+        Args:
+            id (int): donation id
+        """
+        
+        fire_at = self.fire_times.get (id)
+        if fire_at is None:
             return None
         
-        # Write message
-        donation_text = f"cheer{amount} {message}"
-        scraper.send_data (self.selectors["comment_textarea"], donation_text)
-        sleep (5)
+        lateness = max (now_timestamp () - fire_at, 0)
+        self.metrics.observe ("send_lateness_seconds", lateness)
+        self.metrics.annotate (send_lateness=round (lateness, 4))
+        
+    def __forget_donation__ (self, id:int):
+        """ Remove state of a donation who ends, is skipped or is cancelled,
+        and release its partition when it has no other donations
+
+        Args:
+            id (int): donation id
+        """
+        
+        self.fire_times.pop (id, None)
+        self.deadlines.pop (id, None)
+        self.chat_keys.pop (id, None)
+        
+        # Release partition without more donations, for other nodes
+        partition = self.partitions.pop (id, None)
+        if self.coordinator and partition and partition not in self.partitions.values ():
+            self.coordinator.release (partition)
+        
+    def __end_trace__ (self, id:int, result:str):
+        """ Save donation trace and result, and export metrics
+
+        Args:
+            id (int): donation id
+            result (str): "submitted", "failed" or "error"
+        """
+        
+        self.__forget_donation__ (id)
+        self.metrics.inc ("donations_total", result=result)
+        self.metrics.end_trace (result=result)
+        self.metrics.save ()
+        
+    def __check_claim__ (self, id:int) -> bool:
+        """ Validate if this node still owns the partition of the donation,
+        and no other node sent it (like before a lease handoff)
+
+        Args:
+            id (int): donation id
+
+        Returns:
+            bool: True if the donation can be sent
+        """
+        
+        partition = self.partitions.get (id)
+        if not self.coordinator or not partition:
+            return True
+        
+        if not self.coordinator.is_owner (partition):
+            self.__show_message__ (f"partition '{partition}' lost before send, skipped", id, is_error=True)
+            return False
+        
+        if id in self.coordinator.get_sent ([id]):
+            self.__show_message__ ("already sent by other node, skipped", id, is_error=True)
+            return False
+        
+        return True
+        
+    def __update_status__ (self, id:int):
+        """ Queue donation status update to done, for the backend
+
+        Args:
+            id (int): donation id
+        """
+        
+        if DEBUG_MODE:
+            return None
         
-        # Click in accept buttons
-        for selector in self.selectors["comment_accept_buttons"]:
+        self.api.queue_donation_done (id)
+        self.journal.record (id, REPORTED)
+        
+    def __start_cheer__ (self, id:int, scraper) -> Instrumented:
+        """ Show and save start donation status, and measure time and 
+        devtools commands of each scraper call
+
+        Args:
+            id (int): donation id
+            scraper (ChromDevWrapper | AsyncChromDevWrapper): chat tab
+
+        Returns:
+            Instrumented: measured scraper
+        """
+        
+        self.__show_message__ ("starting...", id)
+        self.journal.record (id, STARTED)
+        return Instrumented (scraper, self.metrics, "chrome")
+    
+    def __check_reused_tab__ (self, id:int, snapshot:dict) -> bool:
+        """ Validate inputs of a reused chat tab, to load the chat again if they are not ready
+
+        Args:
+            id (int): donation id
+            snapshot (dict): page elements data, from probe
+
+        Returns:
+            bool: True if the chat tab can be used without loading it
+        """
+        
+        reused = self.__inputs_ready__ (snapshot)
+        if reused:
+            self.__show_message__ ("chat tab reused", id)
+        return reused
+    
+    def __check_chat__ (self, id:int, user:str, snapshot:dict) -> bool:
+        """ Validate inputs of a loaded chat
+
+        Args:
+            id (int): donation id
+            user (str): bot name
+            snapshot (dict): page elements data, from probe
+
+        Returns:
+            bool: True if inputs are visible and available
+        """
+        
+        inputs_valid = self.__validate_inputs__ (id, snapshot)
+        if not inputs_valid:
             
-            accept_elem = scraper.count_elems (selector)
-            if accept_elem:
-                scraper.click (selector)
+            # Chat not available can be an expired session: validate it again next time
+            self.sessions.invalidate (user)
+        return inputs_valid
+    
+    def __mark_submitted__ (self, id:int):
+        """ Save donation as submitted before the send click, to never send it twice after a crash
+
+        Args:
+            id (int): donation id
+        """
+        
+        self.journal.record (id, SUBMITTED)
+        
+        # Debug runs don't click, other nodes must still send the donation
+        if self.coordinator and not DEBUG_MODE:
+            self.coordinator.mark_sent (id)
+    
+    def __confirm_submit__ (self, id:int, warning_text:str):
+        """ Validate and save donation as confirmed, without warnings after submit
+
+        Args:
+            id (int): donation id
+            warning_text (str): text of the warnings after submit
+        """
+        
+        if self.__validate_submit__ (id, warning_text):
+            self.__show_message__ ("sent", id)
+            self.journal.record (id, CONFIRMED)
+        
+    def __cheer__ (self, id:int, stream_chat_link:str, user:str,
+                   message:str, amount:int, scraper:ChromDevWrapper, reused:bool=False) -> bool:
+        """ Login, write and submit the donation message in the chat
+
+        Args:
+            id (int): donation id
+            stream_chat_link (str): link to the chat of the stream
+            user (str): bot name
+            message (str): message to send
+            amount (int): bits of the donation
+            scraper (ChromDevWrapper): chrome dev wrapper instance
+            reused (bool, optional): scraper tab already in the chat, logged with the same bot. Defaults to False.
+            
+        Returns:
+            bool: True if the donation was submitted
+        """
+        
+        scraper = self.__start_cheer__ (id, scraper)
+        
+        # Reused chat tab: only validate inputs again, or load the chat if they are not ready
+        if reused:
+            with self.metrics.span ("validate"):
+                snapshot = scraper.probe (self.selectors)
+            reused = self.__check_reused_tab__ (id, snapshot)
+        
+        if not reused:
+            
+            # Login in twitch and validate
+            with self.metrics.span ("login"):
+                logged = self.__login__ (id, user, scraper)
+            if not logged:
+                return False
+            
+            # Go to chat page and wait for chat input
+            with self.metrics.span ("page_load"):
+                scraper.set_page (stream_chat_link)
+                self.__show_page_stats__ (id, scraper.page_stats)
+                scraper.wait_for_selector (self.selectors["comment_textarea"], timeout=30)
+            
+            # Validate inputs
+            with self.metrics.span ("validate"):
+                snapshot = scraper.probe (self.selectors)
+                inputs_valid = self.__check_chat__ (id, user, snapshot)
+            if not inputs_valid:
+                return False
+        
+        with self.metrics.span ("typing"):
+            
+            # Write message
+            donation_text = f"cheer{amount} {message}"
+            scraper.send_data (self.selectors["comment_textarea"], donation_text, mode=TYPING_MODE)
+            scraper.wait_for_network_idle (timeout=5)
+            
+            # Click in accept buttons
+            snapshot = scraper.probe (self.selectors)
+            for index, selector in enumerate (self.selectors["comment_accept_buttons"]):
                 
-                # Write message (again)
-                donation_text = f"cheer{amount} {message}"
-                scraper.send_data (self.selectors["comment_textarea"], donation_text)
+                if snapshot["comment_accept_buttons"][index]["count"]:
+                    scraper.click (selector)
+                    scraper.wait_for_selector (self.selectors["comment_textarea"], timeout=5)
+                    
+                    # Write message (again) and refresh elements data after click
+                    scraper.send_data (self.selectors["comment_textarea"], donation_text, mode=TYPING_MODE)
+                    snapshot = scraper.probe (self.selectors)
                 
+        self.journal.record (id, TYPED)
+        
+        # Wait for the donation time, with only the send click pending
+        with self.metrics.span ("armed"):
+            sleep (self.__get_fire_delay__ (id))
+        
+        # Skip donation if other node took its partition while preparing
+        if not self.__check_claim__ (id):
+            return False
+        
         # Submit donation
-        if not DEBUG_MODE:
-            scraper.click (self.selectors["comment_send_btn"])
+        with self.metrics.span ("submit"):
+            self.__mark_submitted__ (id)
+            if not DEBUG_MODE:
+                scraper.click (self.selectors["comment_send_btn"])
+            self.__record_send_lateness__ (id)
+            
+            # Wait a moment for warnings after submit
+            warning_text = scraper.wait_for_text (self.selectors["comment_warning_after"], timeout=2)
+        self.__confirm_submit__ (id, warning_text)
         
-        donation_sent = self.__validate_submit__ (id, scraper)
-        if donation_sent:
-            self.__show_message__ ("sent", id)
+        return True
+
+    async def __cheer_async__ (self, id:int, stream_chat_link:str, user:str,
+                               message:str, amount:int, scraper:AsyncChromDevWrapper, reused:bool=False) -> bool:
+        """ Login, write and submit the donation message in the chat, with asyncio wrapper
+
+        Args:
+            id (int): donation id
+            stream_chat_link (str): link to the chat of the stream
+            user (str): bot name
+            message (str): message to send
+            amount (int): bits of the donation
+            scraper (AsyncChromDevWrapper): asyncio chrome dev wrapper instance
+            reused (bool, optional): scraper tab already in the chat, logged with the same bot. Defaults to False.
+            
+        Returns:
+            bool: True if the donation was submitted
+        """
+        
+        scraper = await asyncio.to_thread (self.__start_cheer__, id, scraper)
+        
+        # Reused chat tab: only validate inputs again, or load the chat if they are not ready
+        if reused:
+            with self.metrics.span ("validate"):
+                snapshot = await scraper.probe (self.selectors)
+            reused = self.__check_reused_tab__ (id, snapshot)
+        
+        if not reused:
+            
+            # Login in twitch and validate
+            with self.metrics.span ("login"):
+                logged = await self.__login_async__ (id, user, scraper)
+            if not logged:
+                return False
+            
+            # Go to chat page and wait for chat input
+            with self.metrics.span ("page_load"):
+                await scraper.set_page (stream_chat_link)
+                self.__show_page_stats__ (id, scraper.page_stats)
+                await scraper.wait_for_selector (self.selectors["comment_textarea"], timeout=30)
+            
+            # Validate inputs
+            with self.metrics.span ("validate"):
+                snapshot = await scraper.probe (self.selectors)
+                inputs_valid = self.__check_chat__ (id, user, snapshot)
+            if not inputs_valid:
+                return False
+        
+        with self.metrics.span ("typing"):
+            
+            # Write message
+            donation_text = f"cheer{amount} {message}"
+            await scraper.send_data (self.selectors["comment_textarea"], donation_text, mode=TYPING_MODE)
+            await scraper.wait_for_network_idle (timeout=5)
+            
+            # Click in accept buttons
+            snapshot = await scraper.probe (self.selectors)
+            for index, selector in enumerate (self.selectors["comment_accept_buttons"]):
+                
+                if snapshot["comment_accept_buttons"][index]["count"]:
+                    await scraper.click (selector)
+                    await scraper.wait_for_selector (self.selectors["comment_textarea"], timeout=5)
+                    
+                    # Write message (again) and refresh elements data after click
+                    await scraper.send_data (self.selectors["comment_textarea"], donation_text, mode=TYPING_MODE)
+                    snapshot = await scraper.probe (self.selectors)
+                
+        await asyncio.to_thread (self.journal.record, id, TYPED)
+        
+        # Wait for the donation time, with only the send click pending
+        with self.metrics.span ("armed"):
+            await asyncio.sleep (self.__get_fire_delay__ (id))
         
-        self.running = False
+        # Skip donation if other node took its partition while preparing
+        if not await asyncio.to_thread (self.__check_claim__, id):
+            return False
+        
+        # Submit donation
+        with self.metrics.span ("submit"):
+            await asyncio.to_thread (self.__mark_submitted__, id)
+            if not DEBUG_MODE:
+                await scraper.click (self.selectors["comment_send_btn"])
+            self.__record_send_lateness__ (id)
+            
+            # Wait a moment for warnings after submit
+            warning_text = await scraper.wait_for_text (self.selectors["comment_warning_after"], timeout=2)
+        await asyncio.to_thread (self.__confirm_submit__, id, warning_text)
         
-        # Update donation status
-        if not DEBUG_MODE:
-            response = self.api.set_donation_done (id) 
-            if response != "Donation updated":
-                self.__show_message__ ("not updated", id, is_error=True)
+        return True
 
 if __name__ == "__main__":
     bot = Bot ()
\ No newline at end of file
@@ -0,0 +1,609 @@
+import json
+import asyncio
+from time import monotonic
+from urllib.request import urlopen
+
+import websockets
+
+from chrome_dev import scripts
+from chrome_dev.block_profiles import get_network_stats
+from chrome_dev.launcher import ChromeProcess
+
+
+class AsyncCDPClient ():
+
+    def __init__ (self, ws_url:str):
+        """ Asyncio devtools connection: commands are pipelined by message id
+        and events are dispatched to subscribers
+
+        Args:
+            ws_url (str): websocket debugger url of the target
+        """
+
+        self.ws_url = ws_url
+        self.ws = None
+        self.reader = None
+        self.message_counter = 0
+        self.results = {}
+        self.subscribers = {}
+
+    async def connect (self):
+        """ Open websocket and start reading messages
+        """
+
+        self.ws = await websockets.connect (self.ws_url, max_size=None)
+        self.reader = asyncio.create_task (self.__read__ ())
+
+    async def __read__ (self):
+        """ Resolve command results and dispatch events, until the connection ends
+        """
+
+        try:
+            async for raw_message in self.ws:
+                message = json.loads (raw_message)
+
+                # Command result
+                if "id" in message:
+                    future = self.results.pop (message["id"], None)
+                    if future and not future.done ():
+                        future.set_result (message)
+                    continue
+
+                # Event
+                for callback in list (self.subscribers.get (message.get ("method"), [])):
+                    callback (message.get ("params", {}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+
+            # Release commands waiting for results
+            for future in self.results.values ():
+                if not future.done ():
+                    future.set_exception (ConnectionError ("Chrome connection closed"))
+            self.results.clear ()
+
+    async def send (self, method:str, timeout:float=30, **params) -> dict:
+        """ Send devtools command and wait for its result
+
+        Args:
+            method (str): command name, like "Page.navigate"
+            timeout (float, optional): max seconds to wait for the result. Defaults to 30.
+            params: command params
+
+        Returns:
+            dict: result message, like {"id": 1, "result": {...}}
+        """
+
+        self.message_counter += 1
+        message_id = self.message_counter
+        future = asyncio.get_running_loop ().create_future ()
+        self.results[message_id] = future
+
+        await self.ws.send (json.dumps ({"id": message_id, "method": method, "params": params}))
+        try:
+            return await asyncio.wait_for (future, timeout)
+        finally:
+            self.results.pop (message_id, None)
+
+    def subscribe (self, event:str, callback):
+        """ Call function each time an event is received
+
+        Args:
+            event (str): event name, like "Page.frameStoppedLoading"
+            callback (callable): function who receive event params
+        """
+
+        self.subscribers.setdefault (event, []).append (callback)
+
+    def unsubscribe (self, event:str, callback):
+        """ Stop calling function for an event
+
+        Args:
+            event (str): event name
+            callback (callable): subscribed function
+        """
+
+        callbacks = self.subscribers.get (event, [])
+        if callback in callbacks:
+            callbacks.remove (callback)
+
+    async def wait_event (self, event:str, timeout:float=30) -> dict:
+        """ Wait for the next event with specific name
+
+        Args:
+            event (str): event name
+            timeout (float, optional): max seconds to wait. Defaults to 30.
+
+        Returns:
+            dict: event params, or None after timeout
+        """
+
+        future = asyncio.get_running_loop ().create_future ()
+
+        def callback (params):
+            if not future.done ():
+                future.set_result (params)
+
+        self.subscribe (event, callback)
+        try:
+            return await asyncio.wait_for (future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.unsubscribe (event, callback)
+
+    async def close (self):
+        """ Close websocket connection
+        """
+
+        if self.ws:
+            await self.ws.close ()
+        if self.reader:
+            await self.reader
+
+
+class AsyncChromDevWrapper ():
+
+    def __init__ (self, port:int=9222, host:str="localhost"):
+        """ Asyncio version of ChromDevWrapper. Use "await AsyncChromDevWrapper.create (...)"
+        to open chrome and connect
+
+        Args:
+            port (int, optional): port or chrome running in debug mode. Defaults to 9222.
+            host (str, optional): chrome host. Defaults to "localhost".
+        """
+
+        self.port = port
+        self.host = host
+        self.chrome = None
+        self.browser = None
+        self.process = None
+        self.parent = None
+        self.context_id = ""
+        self.blocked_urls = []
+        self.page_stats = {}
+
+        # Devtools domains already enabled, the first time they are used
+        self.enabled_domains = set ()
+
+    @classmethod
+    async def create (cls, chrome_path:str, port:int=9222, proxy_host:str="", proxy_port:str="",
+                      start_chrome:bool=True, start_killing:bool=False, user_data_dir:str="",
+                      blocked_urls:list=None, headless:bool=False):
+        """ Open chrome and connect to its first tab
+
+        Args:
+            chrome_path (str): path to chrome executable
+            port (int, optional): port or chrome running in debug mode. Defaults to 9222.
+            proxy_host (str, optional): Proxy ip. Defaults to "".
+            proxy_port (str, optional): Proxy port. Defaults to "".
+            start_chrome (bool, optional): Open new chrome instance. Defaults to True.
+            start_killing (bool, optional): Close chrome left by old runs in the same port
+                before start (other chrome windows are not closed). Defaults to False.
+            user_data_dir (str, optional): Chrome profile folder. Defaults to "" (temp profile of the port).
+            blocked_urls (list, optional): url patterns to don't load, from block_profiles. Defaults to None.
+            headless (bool, optional): run chrome without window and with lean flags. Defaults to False.
+
+        Returns:
+            AsyncChromDevWrapper: connected instance
+        """
+
+        wrapper = cls (port=port)
+        if start_chrome:
+            wrapper.process = ChromeProcess (chrome_path, port, proxy_host, proxy_port, user_data_dir, headless=headless)
+            startup_time = await asyncio.to_thread (wrapper.process.start, close_old=start_killing)
+            print (f"Chrome started in port {port} in {startup_time:.2f}s")
+
+        wrapper.blocked_urls = blocked_urls or []
+        tabs = await asyncio.to_thread (wrapper.__get_json__, "json")
+        pages = [tab for tab in tabs if tab.get ("type") == "page"]
+        await wrapper.__connect__ (pages[0]["webSocketDebuggerUrl"])
+        return wrapper
+
+    def __get_json__ (self, endpoint:str):
+        """ Request chrome http debug endpoint
+
+        Args:
+            endpoint (str): endpoint like "json" or "json/version"
+
+        Returns:
+            any: json response
+        """
+
+        with urlopen (f"http://{self.host}:{self.port}/{endpoint}", timeout=5) as response:
+            return json.loads (response.read ())
+
+    async def __connect__ (self, ws_url:str):
+        """ Connect to target (domains are enabled when they are used)
+
+        Args:
+            ws_url (str): websocket debugger url of the target
+        """
+
+        self.chrome = AsyncCDPClient (ws_url)
+        await self.chrome.connect ()
+        self.enabled_domains = set ()
+        
+        if self.blocked_urls:
+            await self.set_blocked_urls (self.blocked_urls)
+            
+    async def __enable_domain__ (self, domain:str):
+        """ Enable devtools domain, only the first time
+
+        Args:
+            domain (str): domain name, like "Network"
+        """
+
+        if domain not in self.enabled_domains:
+            await self.chrome.send (f"{domain}.enable")
+            self.enabled_domains.add (domain)
+            
+    async def set_blocked_urls (self, urls:list):
+        """ Block requests to specific urls, in the current tab
+
+        Args:
+            urls (list): url patterns with wildcards, like "*.png*"
+        """
+        
+        self.blocked_urls = urls
+        await self.__enable_domain__ ("Network")
+        await self.chrome.send ("Network.setBlockedURLs", urls=urls)
+
+    async def new_tab (self, url:str="about:blank"):
+        """ Open new tab in the same chrome, to drive it in parallel
+
+        Args:
+            url (str, optional): initial url. Defaults to "about:blank".
+
+        Returns:
+            AsyncChromDevWrapper: instance connected to the new tab
+        """
+
+        response = await self.chrome.send ("Target.createTarget", url=url)
+        target_id = response["result"]["targetId"]
+
+        tab = AsyncChromDevWrapper (port=self.port, host=self.host)
+        await tab.__connect__ (f"ws://{self.host}:{self.port}/devtools/page/{target_id}")
+        return tab
+
+    async def __browser_command__ (self, method:str, **params) -> dict:
+        """ Run devtools command in the browser target (not in the tab), 
+        like Target.createBrowserContext
+
+        Args:
+            method (str): command name
+            params: command params
+
+        Returns:
+            dict: command result
+        """
+
+        if not self.browser:
+            version = await asyncio.to_thread (self.__get_json__, "json/version")
+            self.browser = AsyncCDPClient (version["webSocketDebuggerUrl"])
+            await self.browser.connect ()
+
+        response = await self.browser.send (method, **params)
+        if "error" in response:
+            raise RuntimeError (f"Devtools command {method} failed: {response['error']}")
+        return response["result"]
+
+    async def create_context (self):
+        """ Create isolated browser context (incognito-like, with its own cookies)
+        with a new tab, in the same chrome process
+
+        Returns:
+            AsyncChromDevWrapper: instance connected to the tab of the new context
+        """
+
+        result = await self.__browser_command__ ("Target.createBrowserContext", disposeOnDetach=False)
+        context_id = result["browserContextId"]
+        result = await self.__browser_command__ ("Target.createTarget", url="about:blank", browserContextId=context_id)
+
+        context = AsyncChromDevWrapper (port=self.port, host=self.host)
+        context.blocked_urls = self.blocked_urls
+        await context.__connect__ (f"ws://{self.host}:{self.port}/devtools/page/{result['targetId']}")
+        context.context_id = context_id
+        context.parent = self
+        return context
+
+    async def get_contexts (self) -> list:
+        """ Get ids of the isolated browser contexts, created with create_context
+
+        Returns:
+            list: browser context ids
+        """
+
+        result = await self.__browser_command__ ("Target.getBrowserContexts")
+        return result["browserContextIds"]
+
+    async def close_context (self):
+        """ Close tab connection and remove its browser context, with its tabs and cookies
+        """
+
+        await self.chrome.close ()
+        if self.context_id:
+            await self.parent.__browser_command__ ("Target.disposeBrowserContext", browserContextId=self.context_id)
+            self.context_id = ""
+
+    async def get_tab_memory (self) -> int:
+        """ Get js heap memory of the current tab, with devtools performance metrics
+
+        Returns:
+            int: js heap total size in bytes, or 0 if it is not available
+        """
+
+        try:
+            await self.__enable_domain__ ("Performance")
+            response = await self.chrome.send ("Performance.getMetrics", timeout=5)
+        except:
+            return 0
+
+        metrics = {metric["name"]: metric["value"] for metric in response["result"]["metrics"]}
+        return int (metrics.get ("JSHeapTotalSize", 0))
+
+    async def is_alive (self) -> bool:
+        """ Check if chrome still answer to devtools commands
+
+        Returns:
+            bool: True if chrome is running and connected
+        """
+
+        return await self.__evaluate__ ("1", timeout=5) == 1
+
+    async def __evaluate__ (self, expression:str, timeout:float=30, **params):
+        """ Run js expression and get its value
+
+        Args:
+            expression (str): js expression
+            timeout (float, optional): max seconds to wait. Defaults to 30.
+            params: extra Runtime.evaluate params
+
+        Returns:
+            any: expression value, or None if it fails
+        """
+
+        try:
+            response = await self.chrome.send ("Runtime.evaluate", timeout=timeout,
+                                               expression=expression, returnByValue=True, **params)
+            return response["result"]["result"]["value"]
+        except:
+            return None
+
+    async def count_elems (self, selector:str) -> int:
+        """ Count elemencts who match with specific css selector
+
+        Args:
+            selector (str): css selector
+        """
+
+        count = await self.__evaluate__ (f"document.querySelectorAll({json.dumps (selector)}).length")
+        return count or 0
+
+    async def set_page (self, page:str):
+        """ Navigate to specific page
+
+        Args:
+            page (str): url to navigate
+        """
+
+        # Collect network events of the page load
+        messages = []
+        events = ["Network.requestWillBeSent", "Network.loadingFinished", "Network.loadingFailed"]
+        callbacks = {
+            event: lambda params, event=event: messages.append ({"method": event, "params": params})
+            for event in events
+        }
+        for event, callback in callbacks.items ():
+            self.chrome.subscribe (event, callback)
+            
+        try:
+            await self.__enable_domain__ ("Network")
+            await self.__enable_domain__ ("Page")
+            loaded = asyncio.create_task (self.chrome.wait_event ("Page.frameStoppedLoading", timeout=60))
+            await self.chrome.send ("Page.navigate", url=page)
+            await loaded
+        finally:
+            for event, callback in callbacks.items ():
+                self.chrome.unsubscribe (event, callback)
+        
+        # Save requests, bytes and blocked requests of the page load
+        self.page_stats = get_network_stats (messages)
+
+    async def delete_cookies (self):
+        """ Delete all cookies in chrome
+        """
+
+        await self.chrome.send ("Network.clearBrowserCookies")
+
+    async def set_cookies (self, cookies:list):
+        """ Set cookies in chrome
+
+        Args:
+            cookies (list): cookies to set with name, value, domain, path,
+                secure, httpOnly and sameSite
+        """
+
+        for cookie in cookies:
+            try:
+                await self.chrome.send (
+                    "Network.setCookie",
+                    name=cookie["name"],
+                    value=cookie["value"],
+                    domain=cookie["domain"],
+                    path=cookie["path"],
+                    secure=cookie["secure"],
+                    httpOnly=cookie["httpOnly"],
+                    sameSite=cookie["sameSite"]
+                )
+            except:
+                pass
+
+    async def send_data (self, selector:str, data:str, mode:str="insert", chunk_size:int=50):
+        """ Send data to specific input using chrome api
+
+        Args:
+            selector (str): css selector
+            data (str): data to send
+            mode (str, optional): typing strategy, like ChromDevWrapper.send_data. Defaults to "insert".
+            chunk_size (int, optional): key events by chunk, in "chunked" mode. Defaults to 50.
+        """
+
+        # Get input and focus it
+        document = await self.chrome.send ("DOM.getDocument")
+        root_id = document["result"]["root"]["nodeId"]
+        result = await self.chrome.send ("DOM.querySelector", nodeId=root_id, selector=selector)
+        await self.chrome.send ("DOM.focus", nodeId=result["result"]["nodeId"])
+
+        # Type text
+        if mode == "insert":
+            await self.chrome.send ("Input.insertText", text=data)
+        elif mode in ["chunked", "keys"]:
+
+            # Commands are pipelined: only wait for the end of each chunk
+            chunk_size = chunk_size if mode == "chunked" else 1
+            for index in range (0, len (data), chunk_size):
+                await asyncio.gather (*[
+                    self.chrome.send ("Input.dispatchKeyEvent", type="char", text=char, unmodifiedText=char)
+                    for char in data[index:index + chunk_size]
+                ])
+        else:
+            raise ValueError (f"Invalid typing mode: {mode}")
+
+    async def click (self, selector:str):
+        """ Click on specific element
+
+        Args:
+            selector (str): css selector
+        """
+
+        await self.__evaluate__ (f"document.querySelector({json.dumps (selector)}).click()")
+
+    async def get_text (self, selector:str) -> str:
+        """ Get text of visible element
+
+        Args:
+            selector (str): css selector
+        """
+
+        text = await self.__evaluate__ (f"document.querySelector({json.dumps (selector)}).textContent")
+        return text.strip () if text else ""
+
+    async def probe (self, selectors:dict) -> dict:
+        """ Get count, visibility and text of many css selectors, in a single request
+
+        Args:
+            selectors (dict): css selectors by name, like ChromDevWrapper.probe
+
+        Returns:
+            dict: elements data by name
+        """
+
+        snapshot = await self.__evaluate__ (scripts.probe (selectors))
+        return snapshot or scripts.empty_snapshot (selectors)
+
+    async def wait_for_selector (self, selector:str, timeout:float=10) -> bool:
+        """ Wait until an element who match with css selector is in the page
+
+        Args:
+            selector (str): css selector
+            timeout (float, optional): max seconds to wait. Defaults to 10.
+
+        Returns:
+            bool: True if the element is found before timeout
+        """
+
+        script = scripts.wait_for_selector (selector, timeout)
+        found = await self.__evaluate__ (script, timeout=timeout + 1, awaitPromise=True)
+        return found is True
+
+    async def wait_for_text (self, selector:str, text:str="", timeout:float=10) -> str:
+        """ Wait until an element who match with css selector contains specific text
+
+        Args:
+            selector (str): css selector
+            text (str, optional): text to wait for. Defaults to "" (any text).
+            timeout (float, optional): max seconds to wait. Defaults to 10.
+
+        Returns:
+            str: element text, or empty string if the text is not found before timeout
+        """
+
+        script = scripts.wait_for_text (selector, text, timeout)
+        found_text = await self.__evaluate__ (script, timeout=timeout + 1, awaitPromise=True)
+        return found_text or ""
+
+    async def wait_for_network_idle (self, idle_time:float=0.5, timeout:float=10, max_requests:int=0) -> bool:
+        """ Wait until the page don't have network activity, using Network events
+
+        Args:
+            idle_time (float, optional): seconds without requests to consider the network idle. Defaults to 0.5.
+            timeout (float, optional): max seconds to wait. Defaults to 10.
+            max_requests (int, optional): requests allowed in progress while idle. Defaults to 0.
+
+        Returns:
+            bool: True if the network is idle before timeout
+        """
+
+        requests = set ()
+        activity = [monotonic ()]
+
+        def on_request (params):
+            requests.add (params.get ("requestId"))
+            activity[0] = monotonic ()
+
+        def on_request_end (params):
+            requests.discard (params.get ("requestId"))
+            activity[0] = monotonic ()
+
+        events = {
+            "Network.requestWillBeSent": on_request,
+            "Network.loadingFinished": on_request_end,
+            "Network.loadingFailed": on_request_end,
+        }
+        for event, callback in events.items ():
+            self.chrome.subscribe (event, callback)
+
+        start = monotonic ()
+        try:
+            await self.__enable_domain__ ("Network")
+            while True:
+                now = monotonic ()
+                if len (requests) <= max_requests and now - activity[0] >= idle_time:
+                    return True
+                if now - start >= timeout:
+                    return False
+                await asyncio.sleep (min (0.1, idle_time))
+        finally:
+            for event, callback in events.items ():
+                self.chrome.unsubscribe (event, callback)
+
+    async def execute_script (self, script:str):
+        """ Run js script and get returns
+
+        Args:
+            script (str): js code
+        """
+
+        return await self.__evaluate__ (script)
+
+    async def close (self, kill_chrome:bool=False):
+        """ Close connection, and optionally the browser
+
+        Args:
+            kill_chrome (bool, optional): close the whole browser. Defaults to False.
+        """
+
+        if kill_chrome:
+            try:
+                await self.chrome.send ("Browser.close", timeout=5)
+            except:
+                pass
+
+        for client in [self.chrome, self.browser]:
+            if client:
+                await client.close ()
+
+        # Terminate chrome processes who not closed with devtools
+        if kill_chrome and self.process:
+            await asyncio.to_thread (self.process.stop)
@@ -0,0 +1,81 @@
+# Url patterns (Network.setBlockedURLs wildcards) of each resource type
+RESOURCE_TYPES = {
+    "Image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "Font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    "Media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+}
+
+# Blocked urls and resource types of each profile
+PROFILES = {
+    "none": {
+        "urls": [],
+        "resource_types": [],
+    },
+    "chat-only": {
+        "urls": [
+            # Emotes, badges and avatars
+            "*static-cdn.jtvnw.net/*",
+            # Video
+            "*.ttvnw.net/*",
+            "*video-weaver*",
+            # Analytics and ads
+            "*spade.twitch.tv*",
+            "*countess.twitch.tv*",
+            "*scorecardresearch.com*",
+            "*google-analytics.com*",
+            "*googletagmanager.com*",
+            "*doubleclick.net*",
+            "*amazon-adsystem.com*",
+            "*imasdk.googleapis.com*",
+        ],
+        "resource_types": ["Image", "Font", "Media"],
+    },
+}
+
+
+def get_blocked_urls (profile:str, urls:list=None, resource_types:list=None) -> list:
+    """ Get url patterns to block, from a profile and extra filters
+
+    Args:
+        profile (str): profile name, like "chat-only"
+        urls (list, optional): extra url patterns. Defaults to None.
+        resource_types (list, optional): extra resource types, like "Image". Defaults to None.
+
+    Returns:
+        list: url patterns for Network.setBlockedURLs
+    """
+
+    if profile not in PROFILES:
+        raise ValueError (f"Invalid block profile: {profile}")
+
+    blocked_urls = PROFILES[profile]["urls"] + (urls or [])
+    for resource_type in PROFILES[profile]["resource_types"] + (resource_types or []):
+        blocked_urls += RESOURCE_TYPES[resource_type]
+
+    # Remove duplicates, keeping order
+    return list (dict.fromkeys (blocked_urls))
+
+
+def get_network_stats (messages:list) -> dict:
+    """ Summarize network events of a page load
+
+    Args:
+        messages (list): devtools messages received while the page loads
+
+    Returns:
+        dict: requests sent, bytes loaded and blocked requests. Example:
+        {'requests': 40, 'bytes': 512000, 'blocked': 120}
+    """
+
+    stats = {"requests": 0, "bytes": 0, "blocked": 0}
+    for message in messages:
+        method = message.get ("method")
+        params = message.get ("params", {})
+        if method == "Network.requestWillBeSent":
+            stats["requests"] += 1
+        elif method == "Network.loadingFinished":
+            stats["bytes"] += params.get ("encodedDataLength", 0)
+        elif method == "Network.loadingFailed" and params.get ("blockedReason"):
+            stats["blocked"] += 1
+
+    return stats
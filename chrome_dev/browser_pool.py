@@ -0,0 +1,117 @@
+from queue import Queue
+from threading import Lock
+from contextlib import contextmanager
+
+from chrome_dev.chrome_dev import ChromDevWrapper
+from chrome_dev.launcher import get_profile_dir
+
+
+class BrowserPool ():
+
+    def __init__ (self, chrome_path:str, size:int=1, base_port:int=9222,
+                  max_uses:int=20, max_memory:int=1500, slots:int=1, blocked_urls:list=None,
+                  headless:bool=False):
+        """ Keep warm chrome instances, each one in its own debug port,
+        and lease them to donations
+
+        Args:
+            chrome_path (str): path to chrome executable
+            size (int, optional): number of chrome instances. Defaults to 1.
+            base_port (int, optional): debug port of the first instance. Defaults to 9222.
+            max_uses (int, optional): leases before restart a browser. Defaults to 20.
+            max_memory (int, optional): max memory in MB before restart a browser. Defaults to 1500.
+            slots (int, optional): leases of the same browser at the same time, 
+                when each one use its own browser context. Defaults to 1.
+            blocked_urls (list, optional): url patterns to don't load in browsers. Defaults to None.
+            headless (bool, optional): run browsers without window and with lean flags. Defaults to False.
+        """
+
+        self.chrome_path = chrome_path
+        self.max_uses = max_uses
+        self.max_memory = max_memory * 1024 * 1024
+        self.blocked_urls = blocked_urls
+        self.headless = headless
+
+        # Browsers, number of leases and active leases, by port
+        self.browsers = {}
+        self.uses = {}
+        self.active = {}
+        self.lock = Lock ()
+        self.ports = [base_port + index for index in range (size)]
+
+        # Free slots: each browser port repeated one time by slot
+        self.slots = Queue ()
+
+        for port in self.ports:
+
+            self.browsers[port] = self.__start_browser__ (port)
+            self.active[port] = 0
+            for _ in range (slots):
+                self.slots.put (port)
+
+    def __start_browser__ (self, port:int) -> ChromDevWrapper:
+        """ Open new chrome instance in specific port, with its own profile
+
+        Args:
+            port (int): chrome debug port
+
+        Returns:
+            ChromDevWrapper: chrome dev wrapper instance
+        """
+
+        self.uses[port] = 0
+        return ChromDevWrapper (
+            chrome_path=self.chrome_path,
+            port=port,
+            user_data_dir=get_profile_dir (port),
+            blocked_urls=self.blocked_urls,
+            headless=self.headless,
+        )
+
+    def __recycle__ (self, port:int):
+        """ Close browser and open a new one in the same port
+
+        Args:
+            port (int): chrome debug port
+        """
+
+        self.browsers[port].close ()
+        self.browsers[port] = self.__start_browser__ (port)
+
+    @contextmanager
+    def lease (self):
+        """ Wait for a free browser and return it to the pool at the end.
+        Unhealthy browsers are restarted before lease, and used browsers after
+        max uses or max memory, when no other lease is using them
+
+        Yields:
+            ChromDevWrapper: chrome dev wrapper instance
+        """
+
+        port = self.slots.get ()
+        try:
+            with self.lock:
+                if not self.active[port] and not self.browsers[port].is_alive ():
+                    print (f"Restarting not responding chrome in port {port}")
+                    self.__recycle__ (port)
+                self.active[port] += 1
+                browser = self.browsers[port]
+
+            try:
+                yield browser
+            finally:
+                with self.lock:
+                    self.active[port] -= 1
+                    self.uses[port] += 1
+                    if not self.active[port] and (self.uses[port] >= self.max_uses or browser.get_memory () > self.max_memory):
+                        self.__recycle__ (port)
+        finally:
+            self.slots.put (port)
+
+    def close (self):
+        """ Close all browsers of the pool
+        """
+
+        with self.lock:
+            for browser in self.browsers.values ():
+                browser.close ()
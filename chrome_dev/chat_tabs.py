@@ -0,0 +1,81 @@
+from threading import Lock
+from collections import OrderedDict
+
+
+class ChatTabs ():
+
+    def __init__ (self, max_tabs:int=4):
+        """ Chat tabs kept open between cheers, to reuse them without login
+        or navigation. The least recently used tabs are evicted over max tabs
+
+        Args:
+            max_tabs (int, optional): max open chat tabs. Defaults to 4.
+        """
+
+        self.max_tabs = max_tabs
+        self.tabs = OrderedDict ()
+        self.lock = Lock ()
+
+    def take (self, key:tuple):
+        """ Remove tab from cache, to use it in a single cheer at the same time
+
+        Args:
+            key (tuple): browser port, bot name and chat link
+
+        Returns:
+            ChromDevWrapper: tab wrapper, or None if the tab is not open
+        """
+
+        with self.lock:
+            return self.tabs.pop (key, None)
+
+    def put (self, key:tuple, tab) -> list:
+        """ Save tab as the most recently used one
+
+        Args:
+            key (tuple): browser port, bot name and chat link
+            tab (ChromDevWrapper): tab wrapper
+
+        Returns:
+            list: evicted tab wrappers (also a different tab replaced in the same key), to close them
+        """
+
+        evicted = []
+        with self.lock:
+
+            # Other cheer of the same bot and chat can end with its own tab at the same time
+            replaced = self.tabs.get (key)
+            if replaced is not None and replaced is not tab:
+                evicted.append (replaced)
+
+            self.tabs[key] = tab
+            self.tabs.move_to_end (key)
+            while len (self.tabs) > self.max_tabs:
+                evicted.append (self.tabs.popitem (last=False)[1])
+        return evicted
+
+    def discard_port (self, port:int) -> list:
+        """ Remove all tabs of a browser, like when its main tab navigates away
+
+        Args:
+            port (int): browser debug port
+
+        Returns:
+            list: removed tab wrappers, to close them
+        """
+
+        with self.lock:
+            keys = [key for key in self.tabs if key[0] == port]
+            return [self.tabs.pop (key) for key in keys]
+
+    def clear (self) -> list:
+        """ Remove all tabs
+
+        Returns:
+            list: removed tab wrappers, to close them
+        """
+
+        with self.lock:
+            tabs = list (self.tabs.values ())
+            self.tabs.clear ()
+        return tabs
@@ -1,13 +1,32 @@
-import os
 import sys
+import json
 import psutil
-from time import sleep
+import requests
+import websocket
+from time import monotonic
+from threading import Lock
+from contextlib import contextmanager
 
 import PyChromeDevTools
 
+from chrome_dev import scripts
+from chrome_dev.block_profiles import get_network_stats
+from chrome_dev.event_filter import FilteredChromeInterface
+from chrome_dev.launcher import ChromeProcess, get_port_processes, kill_processes
+
+
+# Network events of page loads and network activity
+NETWORK_EVENTS = ["Network.requestWillBeSent", "Network.loadingFinished", "Network.loadingFailed"]
+
+# Events who replace the document, and the object group of cached elements
+DOCUMENT_EVENTS = ["DOM.documentUpdated", "Page.frameNavigated"]
+NODES_GROUP = "selector-cache"
+
+
 class ChromDevWrapper ():
     
-    def __init__ (self, chrome_path, port:int=9222, proxy_host:str="", proxy_port:str="", start_chrome:bool=True, start_killing:bool=True):    
+    def __init__ (self, chrome_path, port:int=9222, proxy_host:str="", proxy_port:str="", start_chrome:bool=True, start_killing:bool=True,
+                  user_data_dir:str="", target_id:str="", blocked_urls:list=None, headless:bool=False):    
         """ Open chrome and conhect using PyChromeDevTools
 
         Args:
@@ -15,40 +34,251 @@ class ChromDevWrapper ():
             proxy_host (str, optional): Proxy ip. Defaults to "".
             proxy_port (str, optional): Proxy port. Defaults to "".
             start_chrome (bool, optional): Open new chrome instance. Defaults to True.
-            start_killing (bool, optional): Kill (true) all chrome windows before start. Defaults to True.
+            start_killing (bool, optional): Close chrome left by old runs in the same port
+                before start (other chrome windows are not closed). Defaults to True.
+            user_data_dir (str, optional): Chrome profile folder. Defaults to "" (temp profile of the port).
+            target_id (str, optional): connect to specific tab instead of the first one. Defaults to "".
+            blocked_urls (list, optional): url patterns to don't load, from block_profiles. Defaults to None.
+            headless (bool, optional): run chrome without window and with lean flags. Defaults to False.
         """
         
-        # Validate chrome path
-        if not os.path.exists (chrome_path) or not os.path.isfile (chrome_path):
-            print (f"Chrome path not found: {chrome_path}")
-            sys.exit ()
-        
-        if start_killing:
-            self.quit ()
-            
+        self.process = None
         if start_chrome:
-                        
-            command = f'"{chrome_path}" --remote-debugging-port={port} --remote-allow-origins=*'
-            if proxy_host != "" and proxy_port != "":
-                # Start chrome with proxies
-                command += f' --proxy-server={proxy_host}:{proxy_port}'
-                
-            os.popen (command)
-                
-            sleep (5)
+            self.process = ChromeProcess (chrome_path, port, proxy_host, proxy_port, user_data_dir, headless=headless)
+            try:
+                startup_time = self.process.start (close_old=start_killing)
+            except (FileNotFoundError, RuntimeError) as error:
+                print (error)
+                sys.exit (1)
+            print (f"Chrome started in port {port} in {startup_time:.2f}s")
         
-        self.base_wait_time = 2
+        self.port = port
+        self.lock = Lock ()
+        self.browser = None
+        self.parent = None
+        self.context_id = ""
+        self.target_id = target_id
+        self.blocked_urls = blocked_urls or []
+        self.page_stats = {}
+        
+        # Devtools domains enabled by subscriptions (other events are dropped)
+        self.enabled_domains = set ()
+        
+        # Handles (RemoteObject ids) of the document and elements by css selector, 
+        # until the document changes
+        self.nodes = {}
+        self.document_id = ""
+        self.nodes_tracked = False
+        self.nodes_released = True
         
         try:
-            self.chrome = PyChromeDevTools.ChromeInterface(port=port)
+            self.chrome = FilteredChromeInterface(port=port)
         except:
             print ("Chrome is not open. Please open chrome with the custom shorcut and try again.")
             sys.exit (1)
             
-        self.chrome.Network.enable()
-        self.chrome.Page.enable()
+        if target_id:
+            self.__connect_ws__ (self.chrome, f"ws://localhost:{port}/devtools/page/{target_id}")
+        
+        if self.blocked_urls:
+            self.set_blocked_urls (self.blocked_urls)
         
         
+    def __enable_domain__ (self, domain:str):
+        """ Enable devtools domain, only the first time
+
+        Args:
+            domain (str): domain name, like "Network"
+        """
+        
+        if domain not in self.enabled_domains:
+            getattr (self.chrome, domain).enable ()
+            self.enabled_domains.add (domain)
+    
+    def subscribe (self, *events:str, callback=None):
+        """ Keep devtools events in the messages of next commands and waits,
+        enabling their domains the first time
+
+        Args:
+            events (str): event names, like "Page.frameStoppedLoading"
+            callback (callable, optional): function who receive event params. Defaults to None.
+        """
+        
+        for event in events:
+            self.chrome.subscribe (event, callback)
+            self.__enable_domain__ (event.split (".")[0])
+            
+    def unsubscribe (self, *events:str, callback=None):
+        """ Drop devtools events again (their domains stay enabled)
+
+        Args:
+            events (str): event names
+            callback (callable, optional): subscribed function. Defaults to None.
+        """
+        
+        for event in events:
+            self.chrome.unsubscribe (event, callback)
+    
+    @contextmanager
+    def subscribed (self, *events:str):
+        """ Keep devtools events only inside a with block
+
+        Args:
+            events (str): event names
+        """
+        
+        self.subscribe (*events)
+        try:
+            yield
+        finally:
+            self.unsubscribe (*events)
+            
+    def get_dropped_events (self) -> dict:
+        """ Get counters of dropped devtools events (without subscribers, 
+        or over the max events of a single wait)
+
+        Returns:
+            dict: dropped events by name
+        """
+        
+        return dict (self.chrome.dropped)
+        
+    def __clear_nodes__ (self, params:dict=None):
+        """ Forget element handles when the document changes (handles are 
+        released with the next query)
+
+        Args:
+            params (dict, optional): params of DOM.documentUpdated or Page.frameNavigated. Defaults to None.
+        """
+        
+        # Iframes don't change the elements of the main document
+        if params and params.get ("frame", {}).get ("parentId"):
+            return None
+        
+        self.nodes = {}
+        self.document_id = ""
+        
+    def __call_function__ (self, object_id:str, function:str, *args, object_group:str=""):
+        """ Run js function with a RemoteObject as "this", and the args as 
+        values (without quoting them in js)
+
+        Args:
+            object_id (str): RemoteObject id
+            function (str): js function declaration
+            args: function arguments, json values
+            object_group (str, optional): return RemoteObject in this group, 
+                instead of a value. Defaults to "" (value).
+
+        Returns:
+            dict: RemoteObject result, or None if the object is not available
+        """
+        
+        params = {
+            "objectId": object_id,
+            "functionDeclaration": function,
+            "arguments": [{"value": arg} for arg in args],
+            "returnByValue": not object_group,
+        }
+        if object_group:
+            params["objectGroup"] = object_group
+            
+        response = self.chrome.Runtime.callFunctionOn (**params)
+        try:
+            if "exceptionDetails" in response[0]["result"]:
+                return None
+            return response[0]["result"]["result"]
+        except:
+            return None
+        
+    def __call_on_document__ (self, function:str, *args, object_group:str=""):
+        """ Run js function with the document as "this", using its cached handle
+
+        Args:
+            function (str): js function declaration
+            args: function arguments, json values
+            object_group (str, optional): return RemoteObject in this group. Defaults to "" (value).
+
+        Returns:
+            dict: RemoteObject result, or None if the page is not available
+        """
+        
+        # Track document changes, the first time
+        if not self.nodes_tracked:
+            self.subscribe (*DOCUMENT_EVENTS, callback=self.__clear_nodes__)
+            self.nodes_tracked = True
+        
+        for _ in range (2):
+            
+            # Release handles of the old document, and get the new one
+            if not self.document_id:
+                if not self.nodes_released:
+                    self.chrome.Runtime.releaseObjectGroup (objectGroup=NODES_GROUP)
+                response = self.chrome.Runtime.evaluate (expression="document", objectGroup=NODES_GROUP)
+                try:
+                    self.document_id = response[0]["result"]["result"]["objectId"]
+                    self.nodes_released = False
+                except:
+                    return None
+            
+            result = self.__call_function__ (self.document_id, function, *args, object_group=object_group)
+            if result is not None:
+                return result
+            
+            # Handle of a destroyed page: the navigation event is not read yet
+            self.__clear_nodes__ ()
+        
+        return None
+    
+    def __get_node__ (self, selector:str, refresh:bool=False) -> str:
+        """ Get handle of the first element who match with a css selector
+
+        Args:
+            selector (str): css selector
+            refresh (bool, optional): query the element again. Defaults to False.
+
+        Returns:
+            str: RemoteObject id, or "" if the element is not found
+        """
+        
+        if not refresh and selector in self.nodes:
+            return self.nodes[selector]
+        
+        result = self.__call_on_document__ (scripts.QUERY_SELECTOR, selector, object_group=NODES_GROUP)
+        object_id = (result or {}).get ("objectId", "")
+        
+        # Missing elements are not cached, they can be added later
+        if object_id:
+            self.nodes[selector] = object_id
+        else:
+            self.nodes.pop (selector, None)
+        return object_id
+        
+    def __call_on__ (self, selector:str, function:str, *args):
+        """ Run js function with the first element of a css selector as "this",
+        using its cached handle (queried again if the element was removed)
+
+        Args:
+            selector (str): css selector
+            function (str): js function declaration
+            args: function arguments, json values
+
+        Returns:
+            any: function value, or None if the element is not found
+        """
+        
+        for refresh in [False, True]:
+            object_id = self.__get_node__ (selector, refresh)
+            if not object_id:
+                return None
+            
+            result = self.__call_function__ (object_id, scripts.on_connected (function), *args)
+            value = (result or {}).get ("value")
+            if value is None or value.get ("stale"):
+                continue
+            return value.get ("value")
+        
+        return None
+        
     def count_elems (self, selector:str):
         """ Count elemencts who match with specific css selector
 
@@ -56,9 +286,9 @@ class ChromDevWrapper ():
             selector (str): css selector
         """
         
-        response = self.chrome.Runtime.evaluate (expression=f"document.querySelectorAll('{selector}').length")
+        result = self.__call_on_document__ (scripts.COUNT_ELEMS, selector)
         try:
-            return response[0]['result']["result"]["value"]
+            return result["value"]
         except:
             return 0
     
@@ -69,16 +299,29 @@ class ChromDevWrapper ():
             page (str): url to navigate
         """
         
-        self.chrome.Page.navigate(url=page)
-        self.chrome.wait_event("Page.frameStoppedLoading", timeout=60)
-        sleep (self.base_wait_time)
+        with self.subscribed ("Page.frameStoppedLoading", *NETWORK_EVENTS):
+            _, navigate_messages = self.chrome.Page.navigate(url=page)
+            _, load_messages = self.chrome.wait_event("Page.frameStoppedLoading", timeout=60)
+        
+        # Save requests, bytes and blocked requests of the page load
+        self.page_stats = get_network_stats (navigate_messages + load_messages)
+        
+    def set_blocked_urls (self, urls:list):
+        """ Block requests to specific urls, in the current tab
+
+        Args:
+            urls (list): url patterns with wildcards, like "*.png*"
+        """
+        
+        self.blocked_urls = urls
+        self.__enable_domain__ ("Network")
+        self.chrome.Network.setBlockedURLs (urls=urls)
         
     def delete_cookies (self):
         """ Delete all cookies in chrome
         """
         
         self.chrome.Network.clearBrowserCookies()
-        sleep (self.base_wait_time)  
     
     def set_cookies (self, cookies:list):
         """ Set cookies in chrome
@@ -101,8 +344,7 @@ class ChromDevWrapper ():
                 )
             except:
                 pass
-                
-        sleep (self.base_wait_time)
+
             
     def send_data_js (self, selector:str, data:str):
         """ Send data to specific input, with js
@@ -112,30 +354,59 @@ class ChromDevWrapper ():
             data (str): data to send
         """
                         
-        self.chrome.Runtime.evaluate (expression=f"document.querySelector('{selector}').value = '{data}'")
-        sleep (self.base_wait_time)
+        self.__call_on__ (selector, scripts.SET_VALUE, data)
         
-    def send_data (self, selector:str, data:str):
+    def send_data (self, selector:str, data:str, mode:str="insert", chunk_size:int=50):
         """ Send data to specific input using chrome api
 
         Args:
             selector (str): css selector
             data (str): data to send
+            mode (str, optional): typing strategy. Defaults to "insert".
+                "insert": all text in a single Input.insertText (fires a real input event)
+                "chunked": key events sent in chunks, waiting only the last response of each chunk
+                "keys": one key event per character, waiting each response
+            chunk_size (int, optional): key events by chunk, in "chunked" mode. Defaults to 50.
         """
         
-        # Get input
-        dom = self.chrome.DOM.getDocument()
-        element = self.chrome.DOM.getDocument()[0]["result"]["root"]["nodeId"]
-        result = self.chrome.DOM.querySelector(nodeId=element, selector=selector)
-        node_id = result[0]["result"]["nodeId"]
-        
         # Focus on the input text box
-        self.chrome.DOM.focus(nodeId=node_id)
+        self.__call_on__ (selector, scripts.FOCUS)
         
         # Type text
-        for char in data:
-            self.chrome.Input.dispatchKeyEvent (type="char", text=char, unmodifiedText=char)
-        sleep (self.base_wait_time)
+        if mode == "insert":
+            self.chrome.Input.insertText (text=data)
+        elif mode == "chunked":
+            for index in range (0, len (data), chunk_size):
+                chunk = data[index:index + chunk_size]
+                commands = [
+                    ("Input.dispatchKeyEvent", {"type": "char", "text": char, "unmodifiedText": char})
+                    for char in chunk
+                ]
+                self.__send_commands__ (commands)
+        elif mode == "keys":
+            for char in data:
+                self.chrome.Input.dispatchKeyEvent (type="char", text=char, unmodifiedText=char)
+        else:
+            raise ValueError (f"Invalid typing mode: {mode}")
+            
+    def __send_commands__ (self, commands:list):
+        """ Send many devtools commands without wait for each response, 
+        and wait only for the response of the last one (chrome run them in order)
+
+        Args:
+            commands (list): tuples of method name and params dict
+
+        Returns:
+            tuple: response of the last command and received messages
+        """
+        
+        self.chrome.pop_messages ()
+        for method, params in commands:
+            self.chrome.message_counter += 1
+            message = {"id": self.chrome.message_counter, "method": method, "params": params}
+            self.chrome.ws.send (json.dumps (message))
+            
+        return self.chrome.wait_result (self.chrome.message_counter)
                 
     def click (self, selector:str):
         """ Click on specific element
@@ -144,8 +415,7 @@ class ChromDevWrapper ():
             selector (str): css selector
         """
         
-        self.chrome.Runtime.evaluate (expression=f"document.querySelector('{selector}').click()")
-        sleep (self.base_wait_time)
+        self.__call_on__ (selector, scripts.CLICK)
         
     def get_text (self, selector:str):
         """ Get text of visible element
@@ -154,9 +424,9 @@ class ChromDevWrapper ():
             selector (str): css selector
         """
         
-        response = self.chrome.Runtime.evaluate (expression=f"document.querySelector ('{selector}').textContent")
+        text = self.__call_on__ (selector, scripts.GET_TEXT)
         try: 
-            return response[0]['result']["result"]["value"].strip()
+            return text.strip()
         except:
             return ""
         
@@ -168,9 +438,9 @@ class ChromDevWrapper ():
             attrib (str): attribute to get
         """
         
-        response = self.chrome.Runtime.evaluate (expression=f"document.querySelector ('{selector}').getAttribute ('{attrib}')")
+        value = self.__call_on__ (selector, scripts.GET_ATTRIB, attrib)
         try: 
-            return response[0]['result']["result"]["value"].strip()
+            return value.strip()
         except:
             return ""
         
@@ -182,32 +452,297 @@ class ChromDevWrapper ():
             attrib (str): attribute to get
         """
         
-        script = 'values = [];'
-        script += f'console.log(document.querySelectorAll ("{selector}").forEach(elem => values.push(elem.getAttribute("{attrib}"))));'
-        script += 'values;'
-        response = self.chrome.Runtime.evaluate (expression=script, returnByValue=True)
+        result = self.__call_on_document__ (scripts.GET_ATTRIBS, selector, attrib)
         
         values = []
         try:
-            values = list(map(lambda value: value.strip(), response[0]['result']["result"]["value"]))
+            values = list(map(lambda value: value.strip(), result["value"]))
         except:
             pass
         return values
         
+    def probe (self, selectors:dict) -> dict:
+        """ Get count, visibility and text of many css selectors, in a single request
+
+        Args:
+            selectors (dict): css selectors by name. Values can be a selector 
+                or a list of selectors
+
+        Returns:
+            dict: elements data by name. Example:
+            {
+                'comment_textarea': {'count': 1, 'visible': True, 'text': ''},
+                'comment_accept_buttons': [
+                    {'count': 0, 'visible': False, 'text': ''},
+                    ...
+                ],
+                ...
+            }
+        """
+        
+        script = scripts.probe (selectors)
+        
+        response = self.chrome.Runtime.evaluate (expression=script, returnByValue=True)
+        try:
+            return response[0]['result']["result"]["value"]
+        except:
+            return scripts.empty_snapshot (selectors)
+        
     def quit (self, kill_chrome:bool=True):
         """ Close chrome and conexion   
 
         Args:
-            kill_chrome (bool, optional): Kill (true) all chrome windows. Defaults to True.
+            kill_chrome (bool, optional): Close (true) the chrome instance of the current debug port. Defaults to True.
         """
         
         if kill_chrome:
-            for process in psutil.process_iter(['pid', 'name']):
-                if 'chrome' in process.info['name']:
-                    try:
-                        process.kill()
-                    except:
-                        pass
+            self.close ()
+                    
+    def get_processes (self) -> list:
+        """ Get chrome processes (main and children) of the current debug port
+
+        Returns:
+            list: psutil processes
+        """
+        
+        if self.process:
+            return self.process.get_processes ()
+        
+        # Chrome not started by this instance: search it by port
+        return get_port_processes (self.port)
+    
+    def get_memory (self) -> int:
+        """ Get memory used by the current chrome instance
+
+        Returns:
+            int: resident memory in bytes
+        """
+        
+        memory = 0
+        for process in self.get_processes ():
+            try:
+                memory += process.memory_info ().rss
+            except psutil.Error:
+                pass
+        return memory
+    
+    def get_tab_memory (self) -> int:
+        """ Get js heap memory of the current tab, with devtools performance metrics
+
+        Returns:
+            int: js heap total size in bytes, or 0 if it is not available
+        """
+        
+        try:
+            self.__enable_domain__ ("Performance")
+            metrics = self.chrome.Performance.getMetrics ()[0]["result"]["metrics"]
+        except:
+            return 0
+        
+        metrics = {metric["name"]: metric["value"] for metric in metrics}
+        return int (metrics.get ("JSHeapTotalSize", 0))
+    
+    def __connect_ws__ (self, interface:PyChromeDevTools.ChromeInterface, ws_url:str):
+        """ Move PyChromeDevTools interface to other devtools websocket
+
+        Args:
+            interface (PyChromeDevTools.ChromeInterface): interface to move
+            ws_url (str): websocket debugger url, of a tab or the browser
+        """
+        
+        interface.close ()
+        interface.ws = websocket.create_connection (ws_url)
+        interface.ws.settimeout (interface.timeout)
+        
+    def __browser_command__ (self, method:str, **params) -> dict:
+        """ Run devtools command in the browser target (not in the tab), 
+        like Target.createBrowserContext
+
+        Args:
+            method (str): command name, like "Target.createBrowserContext"
+            params: command params
+
+        Returns:
+            dict: command result
+        """
+        
+        with self.lock:
+            if not self.browser:
+                version = requests.get (f"http://localhost:{self.port}/json/version", timeout=5).json ()
+                self.browser = PyChromeDevTools.ChromeInterface (port=self.port)
+                self.__connect_ws__ (self.browser, version["webSocketDebuggerUrl"])
+            
+            domain, command = method.split (".")
+            response = getattr (getattr (self.browser, domain), command) (**params)
+            
+        if not response[0] or "error" in response[0]:
+            raise RuntimeError (f"Devtools command {method} failed: {response[0]}")
+        return response[0]["result"]
+        
+    def create_context (self):
+        """ Create isolated browser context (incognito-like, with its own cookies)
+        with a new tab, in the same chrome process
+
+        Returns:
+            ChromDevWrapper: instance connected to the tab of the new context
+        """
+        
+        context_id = self.__browser_command__ ("Target.createBrowserContext", disposeOnDetach=False)["browserContextId"]
+        target_id = self.__browser_command__ ("Target.createTarget", url="about:blank", browserContextId=context_id)["targetId"]
+        
+        context = ChromDevWrapper (
+            chrome_path="",
+            port=self.port,
+            start_chrome=False,
+            start_killing=False,
+            target_id=target_id,
+            blocked_urls=self.blocked_urls,
+        )
+        context.context_id = context_id
+        context.parent = self
+        return context
+    
+    def get_contexts (self) -> list:
+        """ Get ids of the isolated browser contexts, created with create_context
+
+        Returns:
+            list: browser context ids
+        """
+        
+        return self.__browser_command__ ("Target.getBrowserContexts")["browserContextIds"]
+    
+    def close_context (self):
+        """ Close tab connection and remove its browser context, with its tabs and cookies
+        """
+        
+        try:
+            self.chrome.close ()
+        except:
+            pass
+        
+        if self.context_id:
+            self.parent.__browser_command__ ("Target.disposeBrowserContext", browserContextId=self.context_id)
+            self.context_id = ""
+        
+    def is_alive (self) -> bool:
+        """ Check if chrome still answer to devtools commands
+
+        Returns:
+            bool: True if chrome is running and connected
+        """
+        
+        try:
+            response = self.chrome.Runtime.evaluate (expression="1")
+            return response[0]['result']["result"]["value"] == 1
+        except:
+            return False
+        
+    def close (self):
+        """ Close connection and only the chrome instance of the current debug port
+        """
+        
+        for interface in [self.chrome, self.browser]:
+            try:
+                interface.close ()
+            except:
+                pass
+        
+        if self.process:
+            self.process.stop ()
+        else:
+            kill_processes (get_port_processes (self.port))
+                    
+    def __evaluate_promise__ (self, expression:str, timeout:float):
+        """ Run js expression who returns a promise, and wait for its value
+
+        Args:
+            expression (str): js expression
+            timeout (float): max seconds to wait for the promise
+
+        Returns:
+            any: promise value, or None if it fails
+        """
+        
+        # Keep socket waiting while the promise runs in the page
+        default_timeout = self.chrome.timeout
+        self.chrome.timeout = timeout + 1
+        try:
+            response = self.chrome.Runtime.evaluate (expression=expression, awaitPromise=True, returnByValue=True)
+            return response[0]['result']["result"]["value"]
+        except:
+            return None
+        finally:
+            self.chrome.timeout = default_timeout
+    
+    def wait_for_selector (self, selector:str, timeout:float=10) -> bool:
+        """ Wait until an element who match with css selector is in the page
+
+        Args:
+            selector (str): css selector
+            timeout (float, optional): max seconds to wait. Defaults to 10.
+
+        Returns:
+            bool: True if the element is found before timeout
+        """
+        
+        script = scripts.wait_for_selector (selector, timeout)
+        
+        return self.__evaluate_promise__ (script, timeout) is True
+    
+    def wait_for_text (self, selector:str, text:str="", timeout:float=10) -> str:
+        """ Wait until an element who match with css selector contains specific text
+
+        Args:
+            selector (str): css selector
+            text (str, optional): text to wait for. Defaults to "" (any text).
+            timeout (float, optional): max seconds to wait. Defaults to 10.
+
+        Returns:
+            str: element text, or empty string if the text is not found before timeout
+        """
+        
+        script = scripts.wait_for_text (selector, text, timeout)
+        
+        return self.__evaluate_promise__ (script, timeout) or ""
+    
+    def wait_for_network_idle (self, idle_time:float=0.5, timeout:float=10, max_requests:int=0) -> bool:
+        """ Wait until the page don't have network activity, using Network events
+
+        Args:
+            idle_time (float, optional): seconds without requests to consider the network idle. Defaults to 0.5.
+            timeout (float, optional): max seconds to wait. Defaults to 10.
+            max_requests (int, optional): requests allowed in progress while idle. Defaults to 0.
+
+        Returns:
+            bool: True if the network is idle before timeout
+        """
+        
+        requests = set ()
+        start = monotonic ()
+        last_activity = start
+        
+        with self.subscribed (*NETWORK_EVENTS):
+            while True:
+                now = monotonic ()
+                if len (requests) <= max_requests and now - last_activity >= idle_time:
+                    return True
+                if now - start >= timeout:
+                    return False
+                
+                # Wait for the next event, until idle time or timeout ends
+                wait_time = min (idle_time - (now - last_activity), timeout - (now - start))
+                message = self.chrome.wait_message (max (wait_time, 0.01))
+                if not message:
+                    continue
+                
+                method = message.get ("method", "")
+                request_id = message.get ("params", {}).get ("requestId")
+                if method == "Network.requestWillBeSent":
+                    requests.add (request_id)
+                    last_activity = monotonic ()
+                elif method in ["Network.loadingFinished", "Network.loadingFailed"]:
+                    requests.discard (request_id)
+                    last_activity = monotonic ()
                     
     def execute_script (self, script:str):
         """ Run js script and get returns
@@ -217,7 +752,6 @@ class ChromDevWrapper ():
         """
         
         response = self.chrome.Runtime.evaluate (expression=script)
-        sleep (self.base_wait_time)
         if response[0]['result']["result"]["type"] == "undefined":
             return None
         return response[0]['result']["result"]["value"]
\ No newline at end of file
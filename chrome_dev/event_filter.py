@@ -0,0 +1,188 @@
+import json
+from time import monotonic
+
+import PyChromeDevTools
+
+# Start of devtools event messages (chrome writes the method first)
+EVENT_PREFIX = '{"method":"'
+
+
+class FilteredChromeInterface (PyChromeDevTools.ChromeInterface):
+
+    def __init__ (self, *args, max_events:int=1000, **kwargs):
+        """ PyChromeDevTools interface who only parses and returns subscribed events.
+        Other events are dropped before parse, and counted
+
+        Args:
+            args: PyChromeDevTools.ChromeInterface args, like port
+            max_events (int, optional): max events returned by a single wait,
+                the oldest ones are dropped. Defaults to 1000.
+            kwargs: PyChromeDevTools.ChromeInterface kwargs
+        """
+
+        # Subscribers and callbacks by event name, and dropped events by name
+        self.events = {}
+        self.callbacks = {}
+        self.dropped = {}
+        self.max_events = max_events
+
+        super ().__init__ (*args, **kwargs)
+
+    def subscribe (self, event:str, callback=None):
+        """ Start keeping an event
+
+        Args:
+            event (str): event name, like "Page.frameStoppedLoading"
+            callback (callable, optional): function who receive event params, each time 
+                the event is read (also by commands who discard their messages). Defaults to None.
+        """
+
+        self.events[event] = self.events.get (event, 0) + 1
+        if callback:
+            self.callbacks.setdefault (event, []).append (callback)
+
+    def unsubscribe (self, event:str, callback=None):
+        """ Stop keeping an event, when all its subscribers are removed
+
+        Args:
+            event (str): event name
+            callback (callable, optional): subscribed function. Defaults to None.
+        """
+
+        callbacks = self.callbacks.get (event, [])
+        if callback in callbacks:
+            callbacks.remove (callback)
+
+        count = self.events.get (event, 0) - 1
+        if count > 0:
+            self.events[event] = count
+        else:
+            self.events.pop (event, None)
+
+    def __drop__ (self, event:str):
+        """ Count dropped event
+
+        Args:
+            event (str): event name
+        """
+
+        self.dropped[event] = self.dropped.get (event, 0) + 1
+
+    def __recv__ (self, timeout:float) -> dict:
+        """ Read the next command result or subscribed event
+
+        Args:
+            timeout (float): max seconds to wait, 0 to only read received messages
+
+        Returns:
+            dict: parsed message, or None after timeout
+        """
+
+        deadline = monotonic () + timeout
+        try:
+            while True:
+                self.ws.settimeout (max (deadline - monotonic (), 0) if timeout else 0)
+                try:
+                    raw_message = self.ws.recv ()
+                except Exception:
+                    return None
+
+                # Drop events without subscribers, without parsing them
+                if raw_message.startswith (EVENT_PREFIX):
+                    event = raw_message[len (EVENT_PREFIX):raw_message.find ('"', len (EVENT_PREFIX))]
+                    if event not in self.events:
+                        self.__drop__ (event)
+                        continue
+
+                message = json.loads (raw_message)
+                for callback in list (self.callbacks.get (message.get ("method"), [])):
+                    callback (message.get ("params", {}))
+                return message
+        finally:
+            self.ws.settimeout (self.timeout)
+
+    def __keep__ (self, messages:list, message:dict):
+        """ Save message in the messages of a wait, dropping the oldest event over max events
+
+        Args:
+            messages (list): messages of the current wait
+            message (dict): new message
+        """
+
+        messages.append (message)
+        if len (messages) > self.max_events:
+            self.__drop__ (messages.pop (0).get ("method", ""))
+
+    def pop_messages (self) -> list:
+        """ Read messages already received
+
+        Returns:
+            list: command results and subscribed events
+        """
+
+        messages = []
+        while True:
+            message = self.__recv__ (0)
+            if message is None:
+                return messages
+            self.__keep__ (messages, message)
+
+    def wait_message (self, timeout:float=None) -> dict:
+        """ Wait for the next command result or subscribed event
+
+        Args:
+            timeout (float, optional): max seconds to wait. Defaults to None (interface timeout).
+
+        Returns:
+            dict: parsed message, or None after timeout
+        """
+
+        return self.__recv__ (self.timeout if timeout is None else timeout)
+
+    def wait_event (self, event:str, timeout:float=None) -> tuple:
+        """ Wait for a subscribed event
+
+        Args:
+            event (str): event name
+            timeout (float, optional): max seconds to wait. Defaults to None (interface timeout).
+
+        Returns:
+            tuple: event message (or None after timeout) and messages received while waiting
+        """
+
+        return self.__wait__ (lambda message: message.get ("method") == event, timeout)
+
+    def wait_result (self, result_id:int, timeout:float=None) -> tuple:
+        """ Wait for the result of a command
+
+        Args:
+            result_id (int): command message id
+            timeout (float, optional): max seconds to wait. Defaults to None (interface timeout).
+
+        Returns:
+            tuple: result message (or None after timeout) and messages received while waiting
+        """
+
+        return self.__wait__ (lambda message: message.get ("id") == result_id, timeout)
+
+    def __wait__ (self, is_match, timeout:float=None) -> tuple:
+        """ Read messages until one of them matches
+
+        Args:
+            is_match (callable): function who validates each message
+            timeout (float, optional): max seconds to wait. Defaults to None (interface timeout).
+
+        Returns:
+            tuple: matching message (or None after timeout) and messages received while waiting
+        """
+
+        timeout = self.timeout if timeout is None else timeout
+        deadline = monotonic () + timeout
+        messages = []
+        while True:
+            message = self.__recv__ (max (deadline - monotonic (), 0.001))
+            if message is None:
+                return None, messages
+            self.__keep__ (messages, message)
+            if is_match (message):
+                return message, messages
@@ -0,0 +1,237 @@
+import os
+import json
+import signal
+import tempfile
+import subprocess
+from time import sleep, perf_counter
+
+import psutil
+import requests
+import websocket
+
+# Flags of headless mode, to reduce memory and background work
+LEAN_FLAGS = [
+    "--headless=new",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-component-extensions-with-background-pages",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+    "--disable-breakpad",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--password-store=basic",
+    "--renderer-process-limit=2",
+    # Keep timers exact in background tabs, for the send click
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+]
+
+
+def get_profile_dir (port:int) -> str:
+    """ Temp chrome profile folder for a chrome instance
+
+    Args:
+        port (int): chrome debug port
+
+    Returns:
+        str: profile folder path
+    """
+
+    return os.path.join (tempfile.gettempdir (), f"twitch-cheer-bot-{port}")
+
+
+def get_port_processes (port:int) -> list:
+    """ Find chrome processes (main and children) started with a debug port,
+    like instances left by old runs
+
+    Args:
+        port (int): chrome debug port
+
+    Returns:
+        list: psutil processes
+    """
+
+    port_arg = f"--remote-debugging-port={port}"
+    processes = []
+    for process in psutil.process_iter (['pid', 'name', 'cmdline']):
+        try:
+            if 'chrome' in process.info['name'] and port_arg in (process.info['cmdline'] or []):
+                processes.append (process)
+                processes += process.children (recursive=True)
+        except psutil.Error:
+            pass
+
+    return processes
+
+
+def kill_processes (processes:list, timeout:float=5):
+    """ Terminate processes, and kill the ones still running after timeout
+
+    Args:
+        processes (list): psutil processes
+        timeout (float, optional): seconds to wait before kill. Defaults to 5.
+    """
+
+    for process in processes:
+        try:
+            process.terminate ()
+        except psutil.Error:
+            pass
+
+    _, alive = psutil.wait_procs (processes, timeout=timeout)
+    for process in alive:
+        try:
+            process.kill ()
+        except psutil.Error:
+            pass
+
+
+class ChromeProcess ():
+
+    def __init__ (self, chrome_path:str, port:int, proxy_host:str="", proxy_port:str="",
+                  user_data_dir:str="", args:list=None, headless:bool=False):
+        """ Chrome instance in debug mode, started in its own process group
+        and with its own profile
+
+        Args:
+            chrome_path (str): path to chrome executable
+            port (int): debug port
+            proxy_host (str, optional): Proxy ip. Defaults to "".
+            proxy_port (str, optional): Proxy port. Defaults to "".
+            user_data_dir (str, optional): Chrome profile folder. Defaults to "" (temp profile of the port).
+            args (list, optional): extra chrome flags. Defaults to None.
+            headless (bool, optional): run without window, with LEAN_FLAGS. Defaults to False.
+        """
+
+        self.chrome_path = chrome_path
+        self.port = port
+        self.user_data_dir = user_data_dir or get_profile_dir (port)
+        self.process = None
+
+        self.command = [
+            chrome_path,
+            f"--remote-debugging-port={port}",
+            "--remote-allow-origins=*",
+            f"--user-data-dir={self.user_data_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+        ]
+        if proxy_host != "" and proxy_port != "":
+            self.command.append (f"--proxy-server={proxy_host}:{proxy_port}")
+        if headless:
+            self.command += LEAN_FLAGS
+        self.command += args or []
+
+    def get_version (self) -> dict:
+        """ Request browser version, available when devtools are ready
+
+        Returns:
+            dict: browser data with webSocketDebuggerUrl, or None if chrome is not ready
+        """
+
+        try:
+            return requests.get (f"http://127.0.0.1:{self.port}/json/version", timeout=1).json ()
+        except (requests.RequestException, ValueError):
+            return None
+
+    def start (self, timeout:float=30, close_old:bool=True) -> float:
+        """ Open chrome and wait until devtools answer
+
+        Args:
+            timeout (float, optional): max seconds to wait for chrome. Defaults to 30.
+            close_old (bool, optional): close chrome left by old runs in the same port. Defaults to True.
+
+        Raises:
+            FileNotFoundError: chrome executable not found
+            RuntimeError: chrome closed or not ready before timeout
+
+        Returns:
+            float: startup seconds
+        """
+
+        if not os.path.isfile (self.chrome_path):
+            raise FileNotFoundError (f"Chrome path not found: {self.chrome_path}")
+
+        if close_old and self.get_version ():
+            kill_processes (get_port_processes (self.port))
+
+        # Own process group, to stop chrome and its children without other browsers
+        kwargs = {"start_new_session": True}
+        if os.name == "nt":
+            kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+        start = perf_counter ()
+        self.process = subprocess.Popen (
+            self.command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            **kwargs
+        )
+
+        while perf_counter () - start < timeout:
+            if self.process.poll () is not None:
+                raise RuntimeError (f"Chrome closed at start, exit code: {self.process.returncode}")
+            if self.get_version ():
+                return perf_counter () - start
+            sleep (0.05)
+
+        self.stop ()
+        raise RuntimeError (f"Chrome not ready in port {self.port} after {timeout} seconds")
+
+    def get_processes (self) -> list:
+        """ Get main process and children of this chrome instance
+
+        Returns:
+            list: psutil processes
+        """
+
+        if not self.process or self.process.poll () is not None:
+            return []
+
+        try:
+            main = psutil.Process (self.process.pid)
+            return [main] + main.children (recursive=True)
+        except psutil.Error:
+            return []
+
+    def stop (self, timeout:float=5):
+        """ Close chrome with devtools, and terminate its processes if it
+        still running after timeout
+
+        Args:
+            timeout (float, optional): seconds to wait for each step. Defaults to 5.
+        """
+
+        if not self.process:
+            return None
+
+        processes = self.get_processes ()
+
+        # Graceful close, saving profile data
+        version = self.get_version ()
+        if version:
+            try:
+                ws = websocket.create_connection (version["webSocketDebuggerUrl"], timeout=timeout)
+                ws.send (json.dumps ({"id": 1, "method": "Browser.close"}))
+                ws.close ()
+            except Exception:
+                pass
+
+        try:
+            self.process.wait (timeout)
+        except subprocess.TimeoutExpired:
+            if os.name != "nt":
+                try:
+                    os.killpg (self.process.pid, signal.SIGTERM)
+                except OSError:
+                    pass
+
+        # Children who survived the main process
+        kill_processes ([process for process in processes if process.is_running ()], timeout)
+        self.process = None
@@ -0,0 +1,137 @@
+import json
+
+
+def probe (selectors:dict) -> str:
+    """ Js to get count, visibility and text of many css selectors
+
+    Args:
+        selectors (dict): css selectors by name. Values can be a selector 
+            or a list of selectors
+
+    Returns:
+        str: js expression
+    """
+    
+    return """((selectors) => {
+        const probeSelector = selector => {
+            const elems = document.querySelectorAll (selector)
+            const elem = elems[0]
+            return {
+                count: elems.length,
+                visible: Boolean (elem && elem.getClientRects ().length),
+                text: elem ? elem.textContent.trim () : "",
+            }
+        }
+        const snapshot = {}
+        for (const [name, value] of Object.entries (selectors)) {
+            snapshot[name] = Array.isArray (value) ? value.map (probeSelector) : probeSelector (value)
+        }
+        return snapshot
+    }) (%s)""" % json.dumps (selectors)
+
+
+def empty_snapshot (selectors:dict) -> dict:
+    """ Probe result when the page is not available
+
+    Args:
+        selectors (dict): css selectors by name
+
+    Returns:
+        dict: elements data by name, all without elements
+    """
+    
+    empty = {'count': 0, 'visible': False, 'text': ''}
+    return {
+        name: [empty] * len (value) if isinstance (value, list) else empty
+        for name, value in selectors.items ()
+    }
+
+
+def wait_for_selector (selector:str, timeout:float) -> str:
+    """ Js promise resolved with true when the css selector is found, 
+    or false after timeout
+
+    Args:
+        selector (str): css selector
+        timeout (float): max seconds to wait
+
+    Returns:
+        str: js expression
+    """
+    
+    return """new Promise (resolve => {
+        const selector = %s
+        if (document.querySelector (selector)) return resolve (true)
+        const observer = new MutationObserver (() => {
+            if (document.querySelector (selector)) {
+                observer.disconnect ()
+                resolve (true)
+            }
+        })
+        observer.observe (document, {childList: true, subtree: true})
+        setTimeout (() => { observer.disconnect (); resolve (false) }, %d)
+    })""" % (json.dumps (selector), timeout * 1000)
+
+
+def wait_for_text (selector:str, text:str, timeout:float) -> str:
+    """ Js promise resolved with the element text when it contains the text, 
+    or empty string after timeout
+
+    Args:
+        selector (str): css selector
+        text (str): text to wait for ("" for any text)
+        timeout (float): max seconds to wait
+
+    Returns:
+        str: js expression
+    """
+    
+    return """new Promise (resolve => {
+        const selector = %s
+        const text = %s
+        const getText = () => {
+            const elem = document.querySelector (selector)
+            const elemText = elem ? elem.textContent.trim () : ""
+            return elemText && elemText.includes (text) ? elemText : ""
+        }
+        if (getText ()) return resolve (getText ())
+        const observer = new MutationObserver (() => {
+            if (getText ()) {
+                observer.disconnect ()
+                resolve (getText ())
+            }
+        })
+        observer.observe (document, {childList: true, subtree: true, characterData: true})
+        setTimeout (() => { observer.disconnect (); resolve ("") }, %d)
+    })""" % (json.dumps (selector), json.dumps (text), timeout * 1000)
+
+
+# Functions for Runtime.callFunctionOn: "this" is the element (or the document),
+# and selectors and data are passed as arguments, never inside the js code
+QUERY_SELECTOR = "function (selector) { return this.querySelector (selector) }"
+COUNT_ELEMS = "function (selector) { return this.querySelectorAll (selector).length }"
+GET_ATTRIBS = """function (selector, attrib) {
+    return Array.from (this.querySelectorAll (selector), elem => elem.getAttribute (attrib))
+}"""
+CLICK = "function () { this.click () }"
+FOCUS = "function () { this.focus () }"
+SET_VALUE = "function (value) { this.value = value }"
+GET_TEXT = "function () { return this.textContent }"
+GET_ATTRIB = "function (attrib) { return this.getAttribute (attrib) }"
+
+
+def on_connected (function:str) -> str:
+    """ Js function who runs other function only if its element is still in the page
+
+    Args:
+        function (str): js function declaration, who uses the element as "this"
+
+    Returns:
+        str: js function declaration, who returns {stale: true} for removed 
+            elements, or {value: ...} with the function value
+    """
+    
+    return """function (...args) {
+        if (!this.isConnected) return {stale: true}
+        return {value: (%s).apply (this, args)}
+    }""" % function
@@ -0,0 +1,195 @@
+""" Lease based claims, to run many bot nodes without sending a donation twice
+
+Each node claims partitions (a bot user or a streamer) for LEASE_TIME seconds,
+renews them in background while it has donations in them, and only runs
+donations of its own partitions. Partitions with expired leases (a stopped
+or crashed node) are taken over by the next node who claims them. Donations
+clicked by any node are saved, so the new owner skips them.
+
+This module use a sqlite file shared by all nodes of the same host (or a
+network folder) as coordinator. The backend can adopt the same protocol:
+
+    POST claims/<partition>/       {"node": "<node>", "lease": 60}
+        200 {"node": "<node>", "expires": <unix time>}   claimed or renewed
+        409 {"node": "<other>", "expires": <unix time>}  owned by other node
+
+    DELETE claims/<partition>/     {"node": "<node>"}
+        204                                               released (only by owner)
+
+    POST donations-sent/<id>/      {"node": "<node>"}
+        200                                               donation clicked
+
+    GET donations-sent/?ids=1,2,3
+        200 {"sent": [1, 3]}                              donations already clicked
+
+Claims must be atomic in the backend: a partition is only assigned when it has
+no owner, the owner is the same node, or the lease already expired.
+"""
+
+import sqlite3
+from time import time
+from threading import Thread, Lock, Event
+
+
+class Coordinator ():
+
+    def __init__ (self, path:str, node:str, lease_time:float=60):
+        """ Local stand-in coordinator of partition leases, saved in sqlite
+
+        Args:
+            path (str): sqlite database file, shared by all nodes
+            node (str): unique name of this node
+            lease_time (float, optional): seconds of each lease. Defaults to 60.
+        """
+
+        self.node = node
+        self.lease_time = lease_time
+
+        # Partitions owned by this node, renewed in background
+        self.owned = set ()
+
+        self.lock = Lock ()
+        self.connection = sqlite3.connect (path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute ("PRAGMA journal_mode=WAL")
+            self.connection.execute ("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    partition TEXT PRIMARY KEY,
+                    node TEXT NOT NULL,
+                    expires REAL NOT NULL
+                )
+            """)
+            self.connection.execute ("""
+                CREATE TABLE IF NOT EXISTS sent (
+                    donation_id INTEGER PRIMARY KEY,
+                    node TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+
+        self.stopped = Event ()
+        self.renewer = Thread (target=self.__run__, daemon=True)
+        self.renewer.start ()
+
+    def claim (self, partition:str) -> bool:
+        """ Claim or renew the lease of a partition
+
+        Args:
+            partition (str): partition key, like "user:bot1" or "streamer:name"
+
+        Returns:
+            bool: True if this node owns the partition
+        """
+
+        now = time ()
+        with self.lock, self.connection:
+
+            # Only take free, own or expired partitions
+            self.connection.execute ("""
+                INSERT INTO leases (partition, node, expires) VALUES (?, ?, ?)
+                ON CONFLICT (partition) DO UPDATE SET node = excluded.node, expires = excluded.expires
+                WHERE leases.node = excluded.node OR leases.expires < ?
+            """, (partition, self.node, now + self.lease_time, now))
+            owner = self.connection.execute (
+                "SELECT node FROM leases WHERE partition = ?", (partition,)
+            ).fetchone ()[0]
+
+            claimed = owner == self.node
+            if claimed:
+                self.owned.add (partition)
+            else:
+                self.owned.discard (partition)
+            return claimed
+
+    def is_owner (self, partition:str) -> bool:
+        """ Check if this node still owns a partition, with a valid lease
+
+        Args:
+            partition (str): partition key
+
+        Returns:
+            bool: True if this node owns the partition
+        """
+
+        with self.lock:
+            row = self.connection.execute (
+                "SELECT node, expires FROM leases WHERE partition = ?", (partition,)
+            ).fetchone ()
+        return bool (row) and row[0] == self.node and row[1] >= time ()
+
+    def release (self, partition:str):
+        """ Release partition, to let other nodes claim it right away
+
+        Args:
+            partition (str): partition key
+        """
+
+        with self.lock, self.connection:
+            self.owned.discard (partition)
+            self.connection.execute (
+                "DELETE FROM leases WHERE partition = ? AND node = ?", (partition, self.node)
+            )
+
+    def mark_sent (self, donation_id:int):
+        """ Save donation as clicked, to skip it in other nodes
+
+        Args:
+            donation_id (int): donation id
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute (
+                "INSERT OR IGNORE INTO sent (donation_id, node, created) VALUES (?, ?, ?)",
+                (donation_id, self.node, time ())
+            )
+
+    def get_sent (self, donation_ids:list) -> set:
+        """ Get donations already clicked by any node
+
+        Args:
+            donation_ids (list): donation ids
+
+        Returns:
+            set: ids of the donations already sent
+        """
+
+        sent = set ()
+        donation_ids = list (donation_ids)
+
+        # Query in chunks, to keep under sqlite variables limit
+        with self.lock:
+            for index in range (0, len (donation_ids), 500):
+                chunk = donation_ids[index:index + 500]
+                placeholders = ", ".join (["?"] * len (chunk))
+                rows = self.connection.execute (
+                    f"SELECT donation_id FROM sent WHERE donation_id IN ({placeholders})",
+                    chunk
+                ).fetchall ()
+                sent.update (row[0] for row in rows)
+
+        return sent
+
+    def __run__ (self):
+        """ Renew owned leases three times by lease
+        """
+
+        while not self.stopped.wait (self.lease_time / 3):
+            with self.lock:
+                partitions = list (self.owned)
+            for partition in partitions:
+                if not self.claim (partition):
+                    print (f"Warning: partition '{partition}' taken by other node")
+
+    def close (self):
+        """ Stop renewals and release owned partitions
+        """
+
+        self.stopped.set ()
+        self.renewer.join ()
+        with self.lock:
+            partitions = list (self.owned)
+        for partition in partitions:
+            self.release (partition)
+
+        with self.lock:
+            self.connection.close ()
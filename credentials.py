@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 load_dotenv()
 API_HOST = os.getenv("API_HOST")
 TOKEN = os.getenv("TOKEN")
-PORT = os.getenv("PORT")
+PORT = int(os.getenv("PORT", 9222))
 CHROME_PATH = os.getenv("CHROME_PATH")
 DEBUG_USERS = os.getenv("DEBUG_USERS")
 if DEBUG_USERS:
@@ -12,3 +12,42 @@ if DEBUG_USERS:
 else:
     DEBUG_USERS = []
 DEBUG_MODE = os.getenv("DEBUG_MODE") == "True"
+WORKERS = int(os.getenv("WORKERS", 1))
+BROWSERS = int(os.getenv("BROWSERS", 1))
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", 20))
+BROWSER_MAX_MEMORY = int(os.getenv("BROWSER_MAX_MEMORY", 1500))
+TYPING_MODE = os.getenv("TYPING_MODE", "insert")
+ASYNC_MODE = os.getenv("ASYNC_MODE") == "True"
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", 10))
+API_RETRIES = int(os.getenv("API_RETRIES", 3))
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+DAEMON_MODE = os.getenv("DAEMON_MODE") == "True"
+POLL_MIN_INTERVAL = float(os.getenv("POLL_MIN_INTERVAL", 15))
+POLL_MAX_INTERVAL = float(os.getenv("POLL_MAX_INTERVAL", 120))
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", "journal.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", 600))
+BROWSER_CONTEXTS = int(os.getenv("BROWSER_CONTEXTS", 0))
+BLOCK_PROFILE = os.getenv("BLOCK_PROFILE", "chat-only")
+BLOCKED_URLS = os.getenv("BLOCKED_URLS")
+if BLOCKED_URLS:
+    BLOCKED_URLS = BLOCKED_URLS.split(",")
+else:
+    BLOCKED_URLS = []
+METRICS_PATH = os.getenv("METRICS_PATH", "metrics.prom")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+TRACES_PATH = os.getenv("TRACES_PATH", "traces.jsonl")
+PRESTAGE_TIME = float(os.getenv("PRESTAGE_TIME", 30))
+NODE_ID = os.getenv("NODE_ID", "")
+CLAIMS_PATH = os.getenv("CLAIMS_PATH", "claims.db")
+PARTITION_BY = os.getenv("PARTITION_BY", "user")
+LEASE_TIME = float(os.getenv("LEASE_TIME", 60))
+CHAT_TABS = int(os.getenv("CHAT_TABS", 4))
+HEADLESS = os.getenv("HEADLESS") == "True"
+TAB_MAX_MEMORY = int(os.getenv("TAB_MAX_MEMORY", 150))
+PREFLIGHT_WORKERS = int(os.getenv("PREFLIGHT_WORKERS", 8))
+CHAT_RATE = float(os.getenv("CHAT_RATE", 30))
+CHAT_BURST = int(os.getenv("CHAT_BURST", 3))
+USER_RATE = float(os.getenv("USER_RATE", 20))
+USER_BURST = int(os.getenv("USER_BURST", 3))
+GLOBAL_RATE = float(os.getenv("GLOBAL_RATE", 0))
+GLOBAL_BURST = int(os.getenv("GLOBAL_BURST", 10))
@@ -0,0 +1,123 @@
+import sqlite3
+from time import time
+from threading import Lock
+
+# Donation states, in execution order
+SCHEDULED = "scheduled"
+STARTED = "started"
+TYPED = "typed"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+REPORTED = "reported"
+
+# Donation not sent by an invalid bot session, it can run again in the next run
+SKIPPED = "skipped"
+
+# States after click in send button: the donation must not be sent again
+SENT_STATES = (SUBMITTED, CONFIRMED, REPORTED)
+
+
+class Journal ():
+
+    def __init__ (self, path:str):
+        """ Local record of donation state transitions, saved in sqlite with
+        fsync in each write, to resume or skip donations after a crash
+
+        Args:
+            path (str): sqlite database file
+        """
+
+        self.lock = Lock ()
+        self.connection = sqlite3.connect (path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute ("PRAGMA journal_mode=WAL")
+            self.connection.execute ("PRAGMA synchronous=FULL")
+
+            # History of transitions, and last state of each donation
+            self.connection.execute ("""
+                CREATE TABLE IF NOT EXISTS transitions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    donation_id INTEGER NOT NULL,
+                    state TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            self.connection.execute ("""
+                CREATE INDEX IF NOT EXISTS transitions_donation_id
+                ON transitions (donation_id)
+            """)
+            self.connection.execute ("""
+                CREATE TABLE IF NOT EXISTS donations (
+                    donation_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            self.connection.execute ("""
+                CREATE INDEX IF NOT EXISTS donations_state
+                ON donations (state)
+            """)
+
+    def record (self, donation_id:int, state:str):
+        """ Save state transition of a donation
+
+        Args:
+            donation_id (int): donation id
+            state (str): new state, like SUBMITTED
+        """
+
+        now = time ()
+        with self.lock, self.connection:
+            self.connection.execute (
+                "INSERT INTO transitions (donation_id, state, created) VALUES (?, ?, ?)",
+                (donation_id, state, now)
+            )
+            self.connection.execute (
+                "INSERT OR REPLACE INTO donations (donation_id, state, updated) VALUES (?, ?, ?)",
+                (donation_id, state, now)
+            )
+
+    def get_state (self, donation_id:int) -> str:
+        """ Get last state of a donation
+
+        Args:
+            donation_id (int): donation id
+
+        Returns:
+            str: last state, or None if the donation is not in the journal
+        """
+
+        return self.get_states ([donation_id]).get (donation_id)
+
+    def get_states (self, donation_ids:list) -> dict:
+        """ Get last state of many donations in a single query
+
+        Args:
+            donation_ids (list): donation ids
+
+        Returns:
+            dict: last state by donation id (only donations in the journal)
+        """
+
+        states = {}
+        donation_ids = list (donation_ids)
+
+        # Query in chunks, to keep under sqlite variables limit
+        with self.lock:
+            for index in range (0, len (donation_ids), 500):
+                chunk = donation_ids[index:index + 500]
+                placeholders = ", ".join (["?"] * len (chunk))
+                rows = self.connection.execute (
+                    f"SELECT donation_id, state FROM donations WHERE donation_id IN ({placeholders})",
+                    chunk
+                ).fetchall ()
+                states.update (dict (rows))
+
+        return states
+
+    def close (self):
+        """ Close database connection
+        """
+
+        with self.lock:
+            self.connection.close ()
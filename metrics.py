@@ -0,0 +1,296 @@
+import os
+import json
+import inspect
+from time import time, perf_counter
+from threading import Thread, Lock
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram upper bounds, in seconds
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float ("inf")]
+
+# Trace of the donation running in the current thread or coroutine
+current_trace = ContextVar ("current_trace", default=None)
+
+
+class Metrics ():
+
+    def __init__ (self, metrics_path:str="", traces_path:str="", port:int=0):
+        """ Counters, histograms and per donation traces, exported as prometheus
+        text (file and / or http endpoint) and jsonl traces
+
+        Args:
+            metrics_path (str, optional): prometheus text file. Defaults to "" (disabled).
+            traces_path (str, optional): jsonl file of donation traces. Defaults to "" (disabled).
+            port (int, optional): local http port of /metrics endpoint. Defaults to 0 (disabled).
+        """
+
+        self.metrics_path = metrics_path
+        self.traces_path = traces_path
+        self.lock = Lock ()
+
+        # Values by metric name and labels
+        self.counters = {}
+        self.histograms = {}
+
+        if port:
+            self.__serve__ (port)
+
+    def __key__ (self, name:str, labels:dict) -> tuple:
+        """ Metric key with sorted labels
+
+        Args:
+            name (str): metric name
+            labels (dict): metric labels
+
+        Returns:
+            tuple: name and labels
+        """
+
+        return (name, tuple (sorted ((key, str (value)) for key, value in labels.items ())))
+
+    def inc (self, name:str, value:float=1, **labels):
+        """ Increase counter
+
+        Args:
+            name (str): metric name, like "donations_total"
+            value (float, optional): value to add. Defaults to 1.
+            labels: metric labels
+        """
+
+        key = self.__key__ (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get (key, 0) + value
+
+    def observe (self, name:str, value:float, **labels):
+        """ Add value to histogram
+
+        Args:
+            name (str): metric name, like "stage_seconds"
+            value (float): value to add
+            labels: metric labels
+        """
+
+        key = self.__key__ (name, labels)
+        with self.lock:
+            histogram = self.histograms.setdefault (key, {"buckets": [0] * len (BUCKETS), "sum": 0, "count": 0})
+            for index, bucket in enumerate (BUCKETS):
+                if value <= bucket:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    @contextmanager
+    def span (self, stage:str):
+        """ Measure time of a donation stage, in histogram and current trace
+
+        Args:
+            stage (str): stage name, like "login"
+        """
+
+        start = perf_counter ()
+        try:
+            yield
+        finally:
+            self.add_span (stage, perf_counter () - start)
+
+    def add_span (self, stage:str, duration:float):
+        """ Save duration of a donation stage, in histogram and current trace
+
+        Args:
+            stage (str): stage name, like "browser_wait"
+            duration (float): stage seconds
+        """
+
+        self.observe ("stage_seconds", duration, stage=stage)
+
+        trace = current_trace.get ()
+        if trace is not None:
+            trace["spans"].append ({"stage": stage, "duration": round (duration, 4)})
+
+    def start_trace (self, id:int, **fields):
+        """ Start trace of a donation in the current thread or coroutine
+
+        Args:
+            id (int): donation id
+            fields: extra trace data
+        """
+
+        current_trace.set ({"id": id, "start": time (), "cdp_commands": 0, "spans": [], **fields})
+
+    def annotate (self, **fields):
+        """ Add data to the trace of the current donation
+
+        Args:
+            fields: trace data, like lateness
+        """
+
+        trace = current_trace.get ()
+        if trace is not None:
+            trace.update (fields)
+
+    def end_trace (self, **fields):
+        """ Save trace of the current donation in jsonl file
+
+        Args:
+            fields: extra trace data, like result
+        """
+
+        trace = current_trace.get ()
+        if trace is None:
+            return None
+        current_trace.set (None)
+
+        trace.update (fields)
+        trace["duration"] = round (time () - trace["start"], 4)
+        if self.traces_path:
+            with self.lock, open (self.traces_path, "a") as file:
+                file.write (json.dumps (trace) + "\n")
+
+    def to_prometheus (self) -> str:
+        """ Export metrics in prometheus text format
+
+        Returns:
+            str: metrics text
+        """
+
+        def format_labels (labels:tuple, extra:tuple=()) -> str:
+            labels = labels + extra
+            if not labels:
+                return ""
+            text = ",".join (f'{key}="{value}"' for key, value in labels)
+            return "{" + text + "}"
+
+        lines = []
+        typed = set ()
+
+        # Type line once by metric family, before its first series
+        def add_type (name:str, kind:str):
+            if name not in typed:
+                typed.add (name)
+                lines.append (f"# TYPE {name} {kind}")
+
+        with self.lock:
+            for (name, labels), value in sorted (self.counters.items ()):
+                add_type (name, "counter")
+                lines.append (f"{name}{format_labels (labels)} {value}")
+
+            for (name, labels), histogram in sorted (self.histograms.items ()):
+                add_type (name, "histogram")
+                for bucket, count in zip (BUCKETS, histogram["buckets"]):
+                    bucket_text = "+Inf" if bucket == float ("inf") else str (bucket)
+                    lines.append (f"{name}_bucket{format_labels (labels, (('le', bucket_text),))} {count}")
+                lines.append (f"{name}_sum{format_labels (labels)} {histogram['sum']}")
+                lines.append (f"{name}_count{format_labels (labels)} {histogram['count']}")
+
+        return "\n".join (lines) + "\n"
+
+    def save (self):
+        """ Write prometheus text file, from any thread
+        """
+
+        if not self.metrics_path:
+            return None
+
+        # Replace the file at once, readers never see a partial file
+        text = self.to_prometheus ()
+        temp_path = f"{self.metrics_path}.tmp"
+        with self.lock:
+            with open (temp_path, "w") as file:
+                file.write (text)
+            os.replace (temp_path, self.metrics_path)
+
+    def __serve__ (self, port:int):
+        """ Start local http server with /metrics endpoint
+
+        Args:
+            port (int): http port
+        """
+
+        metrics = self
+
+        class Handler (BaseHTTPRequestHandler):
+
+            def do_GET (self):
+                body = metrics.to_prometheus ().encode ()
+                self.send_response (200)
+                self.send_header ("Content-Type", "text/plain; version=0.0.4")
+                self.send_header ("Content-Length", str (len (body)))
+                self.end_headers ()
+                self.wfile.write (body)
+
+            def log_message (self, *args):
+                pass
+
+        server = ThreadingHTTPServer (("127.0.0.1", port), Handler)
+        Thread (target=server.serve_forever, daemon=True).start ()
+
+
+class Instrumented ():
+
+    def __init__ (self, target, metrics:Metrics, prefix:str):
+        """ Proxy who measure time and devtools commands of each method call
+
+        Args:
+            target (object): instance to measure, like ChromDevWrapper
+            metrics (Metrics): metrics instance
+            prefix (str): metrics name prefix, like "chrome"
+        """
+
+        self.target = target
+        self.metrics = metrics
+        self.prefix = prefix
+
+    def __getattr__ (self, name:str):
+
+        attribute = getattr (self.target, name)
+        if not callable (attribute):
+            return attribute
+
+        if inspect.iscoroutinefunction (attribute):
+            async def async_method (*args, **kwargs):
+                commands = self.__get_commands__ ()
+                start = perf_counter ()
+                try:
+                    return await attribute (*args, **kwargs)
+                finally:
+                    self.__record__ (name, start, commands)
+            return async_method
+
+        def method (*args, **kwargs):
+            commands = self.__get_commands__ ()
+            start = perf_counter ()
+            try:
+                return attribute (*args, **kwargs)
+            finally:
+                self.__record__ (name, start, commands)
+        return method
+
+    def __get_commands__ (self) -> int:
+        """ Get number of devtools commands sent by the target
+
+        Returns:
+            int: message counter of the devtools connection, or 0
+        """
+
+        chrome = getattr (self.target, "chrome", None)
+        return getattr (chrome, "message_counter", 0)
+
+    def __record__ (self, name:str, start:float, commands:int):
+        """ Save call duration and devtools commands
+
+        Args:
+            name (str): method name
+            start (float): perf counter before call
+            commands (int): devtools commands before call
+        """
+
+        self.metrics.observe (f"{self.prefix}_call_seconds", perf_counter () - start, method=name)
+
+        commands = self.__get_commands__ () - commands
+        if commands > 0:
+            self.metrics.inc ("cdp_commands_total", commands, method=name)
+            trace = current_trace.get ()
+            if trace is not None:
+                trace["cdp_commands"] += commands
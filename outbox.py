@@ -0,0 +1,156 @@
+import sqlite3
+from time import time
+from threading import Thread, Lock, Event
+
+
+class Outbox ():
+
+    def __init__ (self, path:str, deliver, batch_size:int=20, interval:float=2):
+        """ Durable queue of messages to the backend, saved in sqlite and
+        delivered in background. Pending messages of old runs are sent at start
+
+        Args:
+            path (str): sqlite database file
+            deliver (callable): function who receive kind and value of a message,
+                and return True when delivered, False to retry later, or raise
+                ValueError to discard the message
+            batch_size (int, optional): messages delivered in each flush. Defaults to 20.
+            interval (float, optional): seconds between flushes. Defaults to 2.
+        """
+
+        self.deliver = deliver
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self.lock = Lock ()
+        self.connection = sqlite3.connect (path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute ("PRAGMA synchronous=FULL")
+            self.connection.execute ("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            """)
+
+        # Background flusher, starting with messages of old runs
+        self.wake = Event ()
+        self.wake.set ()
+        self.stopped = Event ()
+        self.flusher = Thread (target=self.__run__, daemon=True)
+        self.flusher.start ()
+
+    def put (self, kind:str, value:str):
+        """ Save message and wake up flusher
+
+        Args:
+            kind (str): message type, like "donation_done"
+            value (str): message data, like donation id
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute (
+                "INSERT INTO outbox (kind, value, created) VALUES (?, ?, ?)",
+                (kind, str (value), time ())
+            )
+        self.wake.set ()
+
+    def put_many (self, kind:str, values:list):
+        """ Save many messages of the same kind in a single transaction, 
+        and wake up flusher
+
+        Args:
+            kind (str): message type, like "disable_user"
+            values (list): messages data, like bot names
+        """
+
+        now = time ()
+        with self.lock, self.connection:
+            self.connection.executemany (
+                "INSERT INTO outbox (kind, value, created) VALUES (?, ?, ?)",
+                [(kind, str (value), now) for value in values]
+            )
+        self.wake.set ()
+
+    def pending (self) -> int:
+        """ Count not delivered messages
+
+        Returns:
+            int: number of messages in outbox
+        """
+
+        with self.lock:
+            return self.connection.execute ("SELECT COUNT(*) FROM outbox").fetchone ()[0]
+
+    def flush (self) -> int:
+        """ Deliver oldest pending messages, and remove the delivered ones
+
+        Returns:
+            int: number of delivered messages
+        """
+
+        with self.lock:
+            messages = self.connection.execute (
+                "SELECT id, kind, value FROM outbox ORDER BY id LIMIT ?",
+                (self.batch_size,)
+            ).fetchall ()
+
+        done = []
+        failed = []
+        for id, kind, value in messages:
+            try:
+                if self.deliver (kind, value):
+                    done.append ((id,))
+                else:
+                    failed.append (("not delivered", id))
+            except ValueError as error:
+                print (f"Error: discarded {kind} '{value}': {error}")
+                done.append ((id,))
+            except Exception as error:
+                failed.append ((str (error), id))
+
+        with self.lock, self.connection:
+            self.connection.executemany ("DELETE FROM outbox WHERE id = ?", done)
+            self.connection.executemany (
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                failed
+            )
+
+        return len (done)
+
+    def __run__ (self):
+        """ Flush messages each interval, or when new messages arrive
+        """
+
+        while not self.stopped.is_set ():
+            self.wake.wait (self.interval)
+            self.wake.clear ()
+            self.__flush_all__ ()
+
+    def __flush_all__ (self):
+        """ Deliver batches until outbox is empty or a batch fails
+        """
+
+        while self.pending ():
+            messages = min (self.pending (), self.batch_size)
+            if self.flush () < messages:
+                break
+
+    def close (self):
+        """ Stop flusher, with a last attempt to deliver pending messages
+        """
+
+        self.stopped.set ()
+        self.wake.set ()
+        self.flusher.join ()
+        self.__flush_all__ ()
+
+        pending = self.pending ()
+        if pending:
+            print (f"Warning: {pending} backend updates pending, they will be sent in the next run")
+
+        self.connection.close ()
@@ -0,0 +1,183 @@
+from bisect import insort
+from threading import Lock
+
+# Margin of float errors in token counts
+EPSILON = 1e-9
+
+
+class TokenBucket ():
+
+    def __init__ (self, rate:float, burst:int=1):
+        """ Token bucket with future reservations: sends are saved by timestamp,
+        and new sends take the first time that keeps all of them in budget
+        (also between sends already reserved later)
+
+        Args:
+            rate (float): tokens by minute
+            burst (int, optional): max tokens saved while idle. Defaults to 1.
+        """
+
+        self.rate = rate / 60
+        self.burst = max (burst, 1)
+
+        # Sorted timestamps of the reserved sends, after the last time the bucket was full
+        self.sends = []
+
+    def __refill__ (self, tokens:float, last:float, at:float) -> float:
+        """ Tokens at a timestamp, from the tokens after the last send
+
+        Args:
+            tokens (float): tokens after the last send
+            last (float): timestamp of the last send, or None without sends
+            at (float): timestamp
+
+        Returns:
+            float: tokens at timestamp
+        """
+
+        if last is None:
+            return self.burst
+        return min (self.burst, tokens + (at - last) * self.rate)
+
+    def prune (self, at:float):
+        """ Forget sends before the last time the bucket was full (until timestamp),
+        they can't change new sends after it
+
+        Args:
+            at (float): current timestamp
+        """
+
+        tokens, last, start = self.burst, None, 0
+        for index, send in enumerate (self.sends + [at]):
+            if send > at:
+                break
+            tokens = self.__refill__ (tokens, last, send)
+            if tokens >= self.burst - EPSILON:
+                start = index
+            tokens, last = tokens - 1, send
+        del self.sends[:start]
+
+    def __check__ (self, at:float) -> float:
+        """ Validate a new send at a timestamp
+
+        Args:
+            at (float): timestamp of the new send
+
+        Returns:
+            float: None if the send is in budget, or the next timestamp to try
+        """
+
+        # Tokens before the new send
+        tokens, last, index = self.burst, None, 0
+        while index < len (self.sends) and self.sends[index] <= at:
+            tokens = self.__refill__ (tokens, last, self.sends[index]) - 1
+            last = self.sends[index]
+            index += 1
+        tokens = self.__refill__ (tokens, last, at)
+
+        if tokens < 1 - EPSILON:
+            ready = at + (1 - tokens) / self.rate
+            if index < len (self.sends):
+                ready = min (ready, self.sends[index])
+            return ready
+
+        # The new send takes a token from the next sends, until the bucket is full again
+        tokens, last = tokens - 1, at
+        for send in self.sends[index:]:
+            refilled = tokens + (send - last) * self.rate
+            if refilled >= self.burst:
+                return None
+            tokens, last = refilled - 1, send
+            if tokens < -EPSILON:
+                return send
+
+        return None
+
+    def get_ready_time (self, at:float) -> float:
+        """ Get the first timestamp with a token available
+
+        Args:
+            at (float): requested timestamp
+
+        Returns:
+            float: requested timestamp, or a later one if the bucket is empty
+        """
+
+        ready = at
+        while True:
+            next_try = self.__check__ (ready)
+            if next_try is None:
+                return ready
+            ready = next_try
+
+    def take (self, at:float):
+        """ Use a token
+
+        Args:
+            at (float): timestamp of the token, from get_ready_time
+        """
+
+        insort (self.sends, at)
+
+
+class RateLimiter ():
+
+    def __init__ (self, limits:dict, metrics=None):
+        """ Token buckets by scope (like chat, bot user and global), to pace
+        the cheers under the twitch chat rate limits
+
+        Args:
+            limits (dict): rate by minute and burst by scope, like {"chat": (30, 3)}.
+                Scopes with rate 0 are not limited
+            metrics (Metrics, optional): metrics of wait times by scope. Defaults to None.
+        """
+
+        self.limits = {scope: limit for scope, limit in limits.items () if limit[0] > 0}
+        self.metrics = metrics
+        self.buckets = {}
+        self.lock = Lock ()
+
+    def reserve (self, keys:dict, at:float) -> float:
+        """ Reserve a token in the bucket of each scope, at the first timestamp
+        when all of them have one
+
+        Args:
+            keys (dict): bucket key by scope, like {"chat": link, "user": name}
+            at (float): requested timestamp
+
+        Returns:
+            float: seconds to wait after the requested timestamp
+        """
+
+        with self.lock:
+            buckets = {}
+            for scope, key in keys.items ():
+                if scope not in self.limits:
+                    continue
+                if (scope, key) not in self.buckets:
+                    self.buckets[(scope, key)] = TokenBucket (*self.limits[scope])
+                buckets[scope] = self.buckets[(scope, key)]
+
+            # Wait caused by each scope alone
+            for bucket in buckets.values ():
+                bucket.prune (at)
+            scope_times = {scope: bucket.get_ready_time (at) for scope, bucket in buckets.items ()}
+
+            # First time valid in all buckets
+            ready_time = max (scope_times.values (), default=at)
+            while True:
+                next_time = max ([bucket.get_ready_time (ready_time) for bucket in buckets.values ()], default=ready_time)
+                if next_time <= ready_time:
+                    break
+                ready_time = next_time
+
+            for bucket in buckets.values ():
+                bucket.take (ready_time)
+
+        if self.metrics:
+            for scope, scope_time in scope_times.items ():
+                self.metrics.observe ("rate_limit_wait_seconds", scope_time - at, scope=scope)
+                if scope_time > at:
+                    self.metrics.inc ("rate_limited_total", scope=scope)
+
+        return ready_time - at
@@ -0,0 +1,157 @@
+import heapq
+import traceback
+from time import time
+from itertools import count
+from threading import Thread, Condition
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Scheduler ():
+
+    def __init__ (self, workers:int=1, limiter=None):
+        """ Run jobs at specific timestamps with a single dispatcher thread
+        and a bounded pool of workers
+
+        Args:
+            workers (int, optional): max number of jobs running at the same time. Defaults to 1.
+            limiter (RateLimiter, optional): pace of jobs with rate limits. Defaults to None.
+        """
+
+        self.limiter = limiter
+
+        # Min-heap of jobs: [fire_at, order, callback, args, key, limits, delay], and jobs by key
+        self.jobs = []
+        self.keys = {}
+        self.order = count ()
+        self.condition = Condition ()
+        self.pending = 0
+        self.closed = False
+
+        self.pool = ThreadPoolExecutor (max_workers=workers)
+        self.dispatcher = Thread (target=self.__dispatch__, daemon=True)
+        self.dispatcher.start ()
+
+    def schedule (self, fire_at:float, callback, *args, key=None, limits:dict=None):
+        """ Add job to the schedule
+
+        Args:
+            fire_at (float): unix timestamp when the job must start
+            callback (callable): function to run
+            args: arguments for the callback
+            key (hashable, optional): job id, to cancel it later. Defaults to None.
+            limits (dict, optional): rate limit keys by scope. The job starts when the limiter 
+                admits it, and the callback gets the seconds it was delayed as "delay" keyword. 
+                Defaults to None.
+        """
+
+        with self.condition:
+            delay = 0 if limits else None
+            job = [fire_at, next (self.order), callback, args, key, limits, delay]
+            heapq.heappush (self.jobs, job)
+            if key is not None:
+                self.keys[key] = job
+            self.pending += 1
+
+            # Wake up dispatcher, the new job can be the next one
+            self.condition.notify_all ()
+
+    def cancel (self, key) -> bool:
+        """ Remove job from the schedule, if it is not started yet
+
+        Args:
+            key (hashable): job id
+
+        Returns:
+            bool: True if the job was cancelled
+        """
+
+        with self.condition:
+            job = self.keys.pop (key, None)
+            if not job:
+                return False
+
+            # Mark job as cancelled, the dispatcher will skip it
+            job[2] = None
+            self.pending -= 1
+            self.condition.notify_all ()
+            return True
+
+    def __dispatch__ (self):
+        """ Wait until the next deadline and submit the job to the workers
+        """
+
+        while True:
+            with self.condition:
+
+                # Sleep until the first job is due, or a new job is added
+                while not self.closed:
+
+                    # Drop cancelled jobs
+                    while self.jobs and self.jobs[0][2] is None:
+                        heapq.heappop (self.jobs)
+
+                    if self.jobs and self.jobs[0][0] <= time ():
+                        break
+                    timeout = self.jobs[0][0] - time () if self.jobs else None
+                    self.condition.wait (timeout)
+
+                if self.closed:
+                    return None
+
+                fire_at, _, callback, args, key, limits, delay = heapq.heappop (self.jobs)
+
+                # Reserve rate limit tokens in start order, and move paced jobs
+                # to their admitted time (cancelled paced jobs keep their tokens)
+                if limits and self.limiter:
+                    wait = self.limiter.reserve (limits, fire_at)
+                    if wait > 0:
+                        job = [fire_at + wait, next (self.order), callback, args, key, None, delay + wait]
+                        heapq.heappush (self.jobs, job)
+                        if key is not None:
+                            self.keys[key] = job
+                        continue
+
+                self.keys.pop (key, None)
+
+            kwargs = {} if delay is None else {"delay": delay}
+            self.pool.submit (self.__run_job__, callback, args, kwargs)
+
+    def __run_job__ (self, callback, args:tuple, kwargs:dict):
+        """ Run job in worker and update pending counter
+
+        Args:
+            callback (callable): function to run
+            args (tuple): arguments for the callback
+            kwargs (dict): keyword arguments for the callback
+        """
+
+        try:
+            callback (*args, **kwargs)
+        except Exception:
+            # Show error like a regular thread, without stopping the workers
+            traceback.print_exc ()
+        finally:
+            with self.condition:
+                self.pending -= 1
+                self.condition.notify_all ()
+
+    def join (self):
+        """ Wait until all scheduled jobs end, and stop dispatcher and workers
+        """
+
+        with self.condition:
+            while self.pending:
+                self.condition.wait ()
+
+        self.stop ()
+
+    def stop (self):
+        """ Stop dispatcher without running waiting jobs, and wait for running jobs
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all ()
+
+        self.dispatcher.join ()
+        self.pool.shutdown (wait=True)
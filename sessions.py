@@ -0,0 +1,115 @@
+from time import time
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class SessionManager ():
+
+    def __init__ (self, ttl:float=600, timeout:float=5):
+        """ Validate twitch sessions from bots cookies, without loading twitch pages,
+        and keep valid sessions in cache
+
+        Args:
+            ttl (float, optional): seconds to trust a validated session. Defaults to 600.
+            timeout (float, optional): seconds to wait for twitch validation. Defaults to 5.
+        """
+
+        self.ttl = ttl
+        self.timeout = timeout
+        self.validated = {}
+        self.lock = Lock ()
+        self.session = requests.Session ()
+
+    def get_token (self, cookies:list) -> str:
+        """ Get twitch auth token from cookies, if it is not expired
+
+        Args:
+            cookies (list): cookies with name, value and optional expiration
+
+        Returns:
+            str: auth token, or empty string if it is missing or expired
+        """
+
+        for cookie in cookies:
+            if cookie.get ("name") != "auth-token":
+                continue
+
+            expires = cookie.get ("expirationDate", cookie.get ("expires", -1))
+            if expires and 0 < expires < time ():
+                return ""
+            return cookie.get ("value", "")
+
+        return ""
+
+    def validate (self, user:str, cookies:list) -> bool:
+        """ Check if the bot session is valid, using the cache or the twitch token
+        validation endpoint
+
+        Args:
+            user (str): bot name
+            cookies (list): bot cookies
+
+        Returns:
+            bool: True if the session is valid
+        """
+
+        with self.lock:
+            validated = self.validated.get (user)
+        if validated and time () - validated < self.ttl:
+            return True
+
+        token = self.get_token (cookies)
+        if not token:
+            self.invalidate (user)
+            return False
+
+        try:
+            res = self.session.get (
+                "https://id.twitch.tv/oauth2/validate",
+                headers={"Authorization": f"OAuth {token}"},
+                timeout=self.timeout
+            )
+        except requests.RequestException:
+
+            # Twitch not available: trust the cookie
+            return True
+
+        if res.status_code == 401:
+            self.invalidate (user)
+            return False
+
+        # Only cache sessions confirmed by twitch
+        if res.status_code == 200:
+            with self.lock:
+                self.validated[user] = time ()
+        return True
+
+    def validate_all (self, sessions:dict, workers:int=8) -> dict:
+        """ Validate many bot sessions at the same time
+
+        Args:
+            sessions (dict): cookies by bot name
+            workers (int, optional): max validations at the same time. Defaults to 8.
+
+        Returns:
+            dict: True if the session is valid, by bot name
+        """
+
+        if not sessions:
+            return {}
+
+        with ThreadPoolExecutor (max_workers=workers) as pool:
+            results = pool.map (lambda session: self.validate (*session), sessions.items ())
+            return dict (zip (sessions, results))
+
+    def invalidate (self, user:str):
+        """ Remove bot session from cache, to validate it again in the next use
+
+        Args:
+            user (str): bot name
+        """
+
+        with self.lock:
+            self.validated.pop (user, None)